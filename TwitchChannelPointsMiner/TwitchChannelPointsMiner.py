@@ -2,7 +2,6 @@
 
 import logging
 import os
-import random
 import signal
 import sys
 import threading
@@ -11,6 +10,7 @@ import uuid
 from datetime import datetime
 from pathlib import Path
 
+from TwitchChannelPointsMiner.classes.Bootstrap import Bootstrap
 from TwitchChannelPointsMiner.classes.Chat import ChatPresence, ThreadChat
 from TwitchChannelPointsMiner.classes.entities.PubsubTopic import PubsubTopic
 from TwitchChannelPointsMiner.classes.entities.Streamer import (
@@ -18,7 +18,14 @@ from TwitchChannelPointsMiner.classes.entities.Streamer import (
     StreamerSettings,
 )
 from TwitchChannelPointsMiner.classes.Exceptions import StreamerDoesNotExistException
-from TwitchChannelPointsMiner.classes.Settings import FollowersOrder, Priority, Settings
+from TwitchChannelPointsMiner.classes.HTTPPool import HTTPPool
+from TwitchChannelPointsMiner.classes.Settings import (
+    FollowersOrder,
+    Priority,
+    Settings,
+    StreamState,
+)
+from TwitchChannelPointsMiner.classes.StreamerRegistry import StreamerRegistry
 from TwitchChannelPointsMiner.classes.Twitch import Twitch
 from TwitchChannelPointsMiner.classes.WebSocketsPool import WebSocketsPool
 from TwitchChannelPointsMiner.logger import LoggerSettings, configure_loggers
@@ -27,7 +34,6 @@ from TwitchChannelPointsMiner.utils import (
     at_least_one_value_in_settings_is,
     check_versions,
     get_user_agent,
-    internet_connection_available,
     set_default_settings,
 )
 import secrets
@@ -46,7 +52,6 @@ logging.getLogger("requests").setLevel(logging.ERROR)
 logging.getLogger("werkzeug").setLevel(logging.ERROR)
 logging.getLogger("irc.client").setLevel(logging.ERROR)
 logging.getLogger("seleniumwire").setLevel(logging.ERROR)
-logging.getLogger("websocket").setLevel(logging.ERROR)
 
 logger = logging.getLogger(__name__)
 
@@ -71,6 +76,8 @@ class TwitchChannelPointsMiner:
         "original_streamers",
         "logs_file",
         "queue_listener",
+        "progressive_startup",
+        "max_pubsub_connections",
     ]
 
     def __init__(
@@ -81,6 +88,8 @@ class TwitchChannelPointsMiner:
         enable_analytics: bool = False,
         disable_ssl_cert_verification: bool = False,
         disable_at_in_nickname: bool = False,
+        progressive_startup: bool = False,
+        max_pubsub_connections: int = 10,
         # Settings for logging and selenium as you can see.
         priority: Optional[list] = None,
         # This settings will be global shared trought Settings class
@@ -142,12 +151,18 @@ class TwitchChannelPointsMiner:
 
         # user_agent = get_user_agent("FIREFOX")
         user_agent = get_user_agent("CHROME")
-        self.twitch = Twitch(self.username, user_agent, password)
+        self.twitch = Twitch(
+            self.username, user_agent, password, http_pool=HTTPPool.shared()
+        )
 
         self.claim_drops_startup = claim_drops_startup
+        # Start watching the first streamers while the others are still loading
+        self.progressive_startup = progressive_startup
+        # Twitch recommends no more than 10 PubSub connections per IP address, the least useful topics are left out
+        self.max_pubsub_connections = max_pubsub_connections
         self.priority = priority if isinstance(priority, list) else [priority]
 
-        self.streamers: list[Streamer] = []
+        self.streamers = StreamerRegistry()
         self.events_predictions = {}
         self.minute_watcher_thread = None
         self.sync_campaigns_thread = None
@@ -156,7 +171,8 @@ class TwitchChannelPointsMiner:
         self.session_id = str(uuid.uuid4())
         self.running = False
         self.start_datetime = None
-        self.original_streamers = []
+        # handle in self.streamers -> channel points at startup
+        self.original_streamers = {}
 
         self.logs_file, self.queue_listener = configure_loggers(
             self.username, logger_settings
@@ -291,17 +307,21 @@ class TwitchChannelPointsMiner:
                 f"Loading data for {len(streamers_name)} streamers. Please wait...",
                 extra={"emoji": ":nerd_face:"},
             )
+            # The ids are read from the on-disk cache, the unknown ones are resolved with a few batched requests
+            bootstrap = Bootstrap(self.twitch)
+            pending_streamers = []
+            channel_ids = bootstrap.resolve_channel_ids(streamers_name)
             for username in streamers_name:
                 if username in streamers_name:
-                    time.sleep(secrets.SystemRandom().uniform(0.3, 0.7))
                     try:
+                        if username not in channel_ids:
+                            raise StreamerDoesNotExistException
                         streamer = (
                             streamers_dict[username]
                             if isinstance(streamers_dict[username], Streamer) is True
                             else Streamer(username)
                         )
-                        streamer.channel_id = self.twitch.get_channel_id(
-                            username)
+                        streamer.channel_id = channel_ids[username]
                         streamer.settings = set_default_settings(
                             streamer.settings, Settings.streamer_settings
                         )
@@ -314,43 +334,42 @@ class TwitchChannelPointsMiner:
                                 self.twitch.twitch_login.get_auth_token(),
                                 streamer.username,
                             )
-                        self.streamers.append(streamer)
+                        pending_streamers.append(streamer)
                     except StreamerDoesNotExistException:
                         logger.info(
                             f"Streamer {username} does not exist",
                             extra={"emoji": ":cry:"},
                         )
 
-            # Populate the streamers with default values.
-            # 1. Load channel points and auto-claim bonus
-            # 2. Check if streamers are online
-            # 3. DEACTIVATED: Check if the user is a moderator. (was used before the 5th of April 2021 to deactivate predictions)
-            for streamer in self.streamers:
-                time.sleep(random.uniform(0.3, 0.7))
-                try:
-                    self.twitch.load_channel_points_context(streamer)
-                    self.twitch.check_streamer_online(streamer)
-                    # self.twitch.viewer_is_mod(streamer)
-                except StreamerDoesNotExistException:
-                    logger.info(
-                        f"Streamer {streamer.username} does not exist",
-                        extra={"emoji": ":cry:"},
-                    )
+            if self.progressive_startup is False:
+                # Populate the streamers with default values.
+                # 1. Load channel points and auto-claim bonus
+                # 2. Check if streamers are online
+                # 3. DEACTIVATED: Check if the user is a moderator. (was used before the 5th of April 2021 to deactivate predictions)
+                # Each phase runs concurrently on all the streamers, the GQL operations are batched together
+                for streamer in pending_streamers:
+                    self.streamers.add(streamer)
+                bootstrap.load(self.streamers)
+                logger.info(
+                    f"Loaded {len(self.streamers)} streamers ({bootstrap.report()})",
+                    extra={"emoji": ":stopwatch:"},
+                )
 
-            self.original_streamers = [
-                streamer.channel_points for streamer in self.streamers
-            ]
+                self.original_streamers = {
+                    handle: streamer.channel_points
+                    for handle, streamer in self.streamers.items()
+                }
 
             # If we have at least one streamer with settings = make_predictions True
             make_predictions = at_least_one_value_in_settings_is(
-                self.streamers, "make_predictions", True
+                pending_streamers, "make_predictions", True
             )
 
             # If we have at least one streamer with settings = claim_drops True
             # Spawn a thread for sync inventory and dashboard
             if (
                 at_least_one_value_in_settings_is(
-                    self.streamers, "claim_drops", True)
+                    pending_streamers, "claim_drops", True)
                 is True
             ):
                 self.sync_campaigns_thread = threading.Thread(
@@ -359,7 +378,9 @@ class TwitchChannelPointsMiner:
                 )
                 self.sync_campaigns_thread.name = "Sync campaigns/inventory"
                 self.sync_campaigns_thread.start()
-                time.sleep(30)
+                # With the progressive startup the campaigns are matched while the streamers are loading
+                if self.progressive_startup is False:
+                    time.sleep(30)
 
             self.minute_watcher_thread = threading.Thread(
                 target=self.twitch.send_minute_watched_events,
@@ -372,7 +393,10 @@ class TwitchChannelPointsMiner:
                 twitch=self.twitch,
                 streamers=self.streamers,
                 events_predictions=self.events_predictions,
+                max_connections=self.max_pubsub_connections,
             )
+            # Attach and detach the channel topics when the streamers go online and offline
+            self.twitch.stream_monitor.listeners.append(self.ws_pool.on_stream_state)
 
             # Subscribe to community-points-user. Get update for points spent or gains
             user_id = self.twitch.twitch_login.get_user_id()
@@ -399,56 +423,43 @@ class TwitchChannelPointsMiner:
                     )
                 )
 
-            for streamer in self.streamers:
-                self.ws_pool.submit(
-                    PubsubTopic("video-playback-by-id", streamer=streamer)
+            if self.progressive_startup is True:
+                # The watcher and the WebSocket are already running, each streamer joins them as soon as it's loaded
+                bootstrap.activate(pending_streamers, self.__activate_streamer)
+                logger.info(
+                    f"Loaded {len(self.streamers)} streamers ({bootstrap.report()})",
+                    extra={"emoji": ":stopwatch:"},
                 )
-
-                if streamer.settings.follow_raid is True:
-                    self.ws_pool.submit(PubsubTopic("raid", streamer=streamer))
-
-                if streamer.settings.make_predictions is True:
-                    self.ws_pool.submit(
-                        PubsubTopic("predictions-channel-v1",
-                                    streamer=streamer)
-                    )
-
-                if streamer.settings.claim_moments is True:
-                    self.ws_pool.submit(
-                        PubsubTopic("community-moments-channel-v1",
-                                    streamer=streamer)
-                    )
-
-                if streamer.settings.community_goals is True:
-                    self.ws_pool.submit(
-                        PubsubTopic("community-points-channel-v1",
-                                    streamer=streamer)
-                    )
+            else:
+                for streamer in self.streamers:
+                    self.__subscribe_streamer(streamer)
 
             refresh_context = time.time()
             while self.running:
                 time.sleep(secrets.SystemRandom().uniform(20, 60))
-                # Do an external control for WebSocket. Check if the thread is running
-                # Check if is not None because maybe we have already created a new connection on array+1 and now index is None
-                for index in range(0, len(self.ws_pool.ws)):
-                    if (
-                        self.ws_pool.ws[index].is_reconnecting is False
-                        and self.ws_pool.ws[index].elapsed_last_ping() > 10
-                        and internet_connection_available() is True
-                    ):
-                        logger.info(
-                            f"#{index} - The last PING was sent more than 10 minutes ago. Reconnecting to the WebSocket..."
-                        )
-                        WebSocketsPool.handle_reconnection(
-                            self.ws_pool.ws[index])
-
+                # The WebSockets ping and reconnect by themselves, on the event loop
                 if ((time.time() - refresh_context) // 60) >= 30:
                     refresh_context = time.time()
-                    for index in range(0, len(self.streamers)):
-                        if self.streamers[index].is_online:
-                            self.twitch.load_channel_points_context(
-                                self.streamers[index]
-                            )
+                    for streamer in self.streamers:
+                        if streamer.is_online:
+                            self.twitch.load_channel_points_context(streamer)
+
+    def __activate_streamer(self, streamer):
+        handle = self.streamers.add(streamer)
+        self.original_streamers[handle] = streamer.channel_points
+        # Checked while it wasn't registered, the selector ignored it: a live streamer is a candidate right now
+        self.twitch.watch_selector.update(streamer)
+        self.__subscribe_streamer(streamer)
+
+    def __subscribe_streamer(self, streamer):
+        self.ws_pool.submit(
+            PubsubTopic("video-playback-by-id", streamer=streamer)
+        )
+
+        # The other topics only while the stream is live, then WebSocketsPool.on_stream_state takes care of them
+        if streamer.state != StreamState.OFFLINE:
+            for topic in WebSocketsPool.channel_topics(streamer):
+                self.ws_pool.submit(topic)
 
     def end(self, signum, frame):
         if not self.running:
@@ -466,6 +477,9 @@ class TwitchChannelPointsMiner:
                     streamer.irc_chat.join()
 
         self.running = self.twitch.running = False
+        self.twitch.client_version.stop()
+        self.twitch.spade_url.stop()
+        self.twitch.gql_batcher.stop()
         if self.ws_pool is not None:
             self.ws_pool.end()
 
@@ -475,6 +489,8 @@ class TwitchChannelPointsMiner:
         if self.sync_campaigns_thread is not None:
             self.sync_campaigns_thread.join()
 
+        self.twitch.async_client.stop()
+
         # Check if all the mutex are unlocked.
         # Prevent breaks of .json file
         for streamer in self.streamers:
@@ -502,6 +518,60 @@ class TwitchChannelPointsMiner:
             f"Duration {datetime.now() - self.start_datetime}",
             extra={"emoji": ":hourglass:"},
         )
+        if self.twitch.first_watch_at is not None:
+            logger.info(
+                f"Time to first watch: {self.twitch.first_watch_at - self.start_datetime.timestamp():.1f}s",
+                extra={"emoji": ":stopwatch:"},
+            )
+        logger.debug(
+            f"Client version: {self.twitch.client_version.version}, changed {self.twitch.client_version.changes} times"
+        )
+        logger.debug(
+            f"Spade URL: downloaded {self.twitch.spade_url.fetches} times, changed {self.twitch.spade_url.changes} times"
+        )
+        logger.debug(
+            f"HLS cache: {self.twitch.hls_cache.hits} hits, {self.twitch.hls_cache.misses} misses"
+        )
+        logger.debug(
+            f"M3U8: {self.twitch.m3u8.parsed} media playlists parsed, {self.twitch.m3u8.reused} reused"
+        )
+        logger.debug(
+            f"Stream monitor: {self.twitch.stream_monitor.checks} stream info requests, transitions {self.twitch.stream_monitor.stats()}"
+        )
+        if self.ws_pool is not None:
+            gaps = self.ws_pool.gaps_stats()
+            logger.debug(
+                f"PubSub: {gaps['reconnections']} reconnections, {gaps['total']}s without connection (max {gaps['max']}s)"
+            )
+        for channel, stats in self.twitch.watch_jitter.stats().items():
+            logger.debug(
+                f"Watch jitter {channel}: {stats['events']} intervals, avg {stats['avg']}s, max {stats['max']}s"
+            )
+        logger.debug(
+            f"GQL batcher: {self.twitch.gql_batcher.operations} operations sent with {self.twitch.gql_batcher.batches} requests"
+        )
+        async_stats = self.twitch.async_client.stats()
+        logger.debug(
+            f"Async client: {async_stats['requests']} requests, {async_stats['connections']} connections, {async_stats['reused']} reused"
+        )
+        for priority, stats in self.twitch.gql_scheduler.stats().items():
+            logger.debug(
+                f"GQL scheduler {priority}: {stats['granted']} granted, {stats['expired']} expired, {stats['queued']} queued, {stats['avg_wait']}s average wait"
+            )
+        logger.debug(
+            f"GQL scheduler max queue depth: {self.twitch.gql_scheduler.max_queue_depth}"
+        )
+        logger.debug(
+            f"GQL single-flight: {self.twitch.gql_deduplicated} duplicate requests saved"
+        )
+        for operation_name, stats in self.twitch.gql_cache.stats().items():
+            logger.debug(
+                f"GQL cache {operation_name}: {stats['hits']} hits, {stats['misses']} misses, hit rate {stats['hit_rate']}"
+            )
+        for host, stats in self.twitch.http_pool.stats().items():
+            logger.debug(
+                f"HTTP pool {host}: {stats['requests']} requests, {stats['connections']} connections, {stats['reused']} reused"
+            )
 
         if not Settings.logger.less and self.events_predictions != {}:
             print("")
@@ -526,25 +596,24 @@ class TwitchChannelPointsMiner:
                     )
 
         print("")
-        for streamer_index in range(0, len(self.streamers)):
-            if self.streamers[streamer_index].history != {}:
-                gained = (
-                    self.streamers[streamer_index].channel_points
-                    - self.original_streamers[streamer_index]
+        for handle, streamer in self.streamers.items():
+            if streamer.history != {}:
+                gained = streamer.channel_points - self.original_streamers.get(
+                    handle, streamer.channel_points
                 )
 
                 from colorama import Fore
                 streamer_highlight = Fore.YELLOW
 
                 streamer_gain = (
-                    f"{streamer_highlight}{self.streamers[streamer_index]}{Fore.RESET}, Total Points Gained: {_millify(gained)}"
+                    f"{streamer_highlight}{streamer}{Fore.RESET}, Total Points Gained: {_millify(gained)}"
                     if Settings.logger.less
-                    else f"{streamer_highlight}{repr(self.streamers[streamer_index])}{Fore.RESET}, Total Points Gained (after farming - before farming): {_millify(gained)}"
+                    else f"{streamer_highlight}{repr(streamer)}{Fore.RESET}, Total Points Gained (after farming - before farming): {_millify(gained)}"
                 )
 
                 indent = ' ' * 25
                 streamer_history = '\n'.join(
-                    f"{indent}{history}" for history in self.streamers[streamer_index].print_history().split('; '))
+                    f"{indent}{history}" for history in streamer.print_history().split('; '))
 
                 logger.info(
                     f"{streamer_gain}\n{streamer_history}",
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+
+import aiohttp
+
+from TwitchChannelPointsMiner.classes.HTTPPool import HTTPPool
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncClient(object):
+    """
+    A single asyncio event loop (running in its own daemon thread) shared by all the Twitch I/O.
+    Concurrent requests cost coroutines instead of threads and the connections are bounded by max_connections.
+    """
+
+    __slots__ = [
+        "max_connections",
+        "http_pool",
+        "loop",
+        "requests",
+        "connections",
+        "reused",
+        "__session",
+        "__thread",
+        "__lock",
+    ]
+
+    def __init__(self, max_connections: int = 20, http_pool: HTTPPool = None):
+        self.max_connections = max_connections
+        # Used only for the per-host timeouts, the connections are managed by aiohttp
+        self.http_pool = HTTPPool.shared() if http_pool is None else http_pool
+        self.loop = None
+        self.requests = 0
+        self.connections = 0
+        self.reused = 0
+        self.__session = None
+        self.__thread = None
+        self.__lock = threading.Lock()
+
+    def start(self):
+        with self.__lock:
+            if self.loop is not None:
+                return
+            self.loop = asyncio.new_event_loop()
+            self.__thread = threading.Thread(target=self.loop.run_forever)
+            self.__thread.daemon = True
+            self.__thread.name = "Async loop"
+            self.__thread.start()
+
+    def in_loop(self) -> bool:
+        return self.__thread is not None and threading.current_thread() is self.__thread
+
+    def submit(self, coro) -> Future:
+        if self.loop is None:
+            self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        # Synchronous bridge, must never be called from the loop itself (it would wait forever)
+        if self.in_loop():
+            coro.close()
+            raise RuntimeError("AsyncClient.run can't be called from the event loop")
+        return self.submit(coro).result(timeout)
+
+    def stop(self):
+        if self.loop is None:
+            return
+        if self.__session is not None and self.in_loop() is False:
+            try:
+                self.run(self.__session.close(), timeout=5)
+            except Exception:
+                pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def __get_session(self) -> aiohttp.ClientSession:
+        # Always called from the loop, there is no race between check and assignment
+        if self.__session is None or self.__session.closed:
+            trace_config = aiohttp.TraceConfig()
+            trace_config.on_request_start.append(self.__on_request_start)
+            trace_config.on_connection_create_end.append(
+                self.__on_connection_create_end
+            )
+            trace_config.on_connection_reuseconn.append(self.__on_connection_reuseconn)
+            self.__session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                trace_configs=[trace_config],
+                # HTTP(S)_PROXY and NO_PROXY, as requests does
+                trust_env=True,
+            )
+        return self.__session
+
+    async def __on_request_start(self, session, context, params):
+        self.requests += 1
+
+    async def __on_connection_create_end(self, session, context, params):
+        self.connections += 1
+
+    async def __on_connection_reuseconn(self, session, context, params):
+        self.reused += 1
+
+    async def request(self, method, url, headers=None, data=None, timeout=None):
+        # Returns (status code, body as text)
+        timeout = self.http_pool.timeout(url) if timeout is None else timeout
+        async with self.__get_session().request(
+            method,
+            url,
+            headers=headers,
+            data=data,
+            timeout=aiohttp.ClientTimeout(total=timeout),
+        ) as response:
+            return response.status, await response.text()
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    async def head(self, url, **kwargs):
+        return await self.request("HEAD", url, **kwargs)
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "connections": self.connections,
+            "reused": self.reused,
+        }
@@ -0,0 +1,100 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from TwitchChannelPointsMiner.classes.Exceptions import StreamerDoesNotExistException
+
+logger = logging.getLogger(__name__)
+
+
+class Bootstrap(object):
+    """
+    Load the streamers at startup in phases (channel ids, channel points, online status).
+    Inside a phase the streamers are processed concurrently by at most max_workers threads,
+    their GQL operations are sent with batch=True so the GQLBatcher packs them into a few POSTs.
+    """
+
+    __slots__ = ["twitch", "max_workers", "timings"]
+
+    def __init__(self, twitch, max_workers: int = 20):
+        self.twitch = twitch
+        # Same as GQLBatcher.max_batch_size, a full window becomes a single POST
+        self.max_workers = max_workers
+        # phase name -> seconds
+        self.timings = {}
+
+    def resolve_channel_ids(self, usernames: list) -> dict:
+        start = time.time()
+        channel_ids = self.twitch.get_channel_ids(usernames)
+        self.timings["channel ids"] = time.time() - start
+        return channel_ids
+
+    def load(self, streamers: list) -> list:
+        # Returns the streamers that still exist
+        streamers = self.phase(
+            "channel points", self.twitch.load_channel_points_context, streamers
+        )
+        return self.phase("online status", self.twitch.check_streamer_online, streamers)
+
+    def activate(self, streamers: list, on_ready):
+        # Progressive startup: all the phases of a streamer run in the same task and on_ready(streamer)
+        # is called as soon as the streamer and the ones before it in the list (higher priority) are loaded
+        start = time.time()
+        # A snapshot, the streamers may be a StreamerRegistry shared with other threads
+        streamers = list(streamers)
+        with ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="Bootstrap"
+        ) as executor:
+            futures = [
+                executor.submit(self.__load_streamer, streamer)
+                for streamer in streamers
+            ]
+            for streamer, future in zip(streamers, futures):
+                if future.result() is True:
+                    on_ready(streamer)
+        self.timings["activation"] = time.time() - start
+
+    def __load_streamer(self, streamer) -> bool:
+        return self.__call(
+            self.twitch.load_channel_points_context, streamer
+        ) is True and self.__call(self.twitch.check_streamer_online, streamer)
+
+    def phase(self, name: str, function, streamers: list) -> list:
+        start = time.time()
+        # A snapshot, the streamers may be a StreamerRegistry shared with other threads
+        streamers = list(streamers)
+        with ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix=f"Bootstrap {name}"
+        ) as executor:
+            exists = list(
+                executor.map(
+                    lambda streamer: self.__call(function, streamer), streamers
+                )
+            )
+        self.timings[name] = time.time() - start
+        logger.debug(
+            f"Bootstrap phase '{name}' completed for {len(streamers)} streamers in {self.timings[name]:.2f}s"
+        )
+        return [streamer for streamer, exist in zip(streamers, exists) if exist is True]
+
+    @staticmethod
+    def __call(function, streamer) -> bool:
+        try:
+            function(streamer)
+        except StreamerDoesNotExistException:
+            logger.info(
+                f"Streamer {streamer.username} does not exist",
+                extra={"emoji": ":cry:"},
+            )
+            return False
+        except Exception:
+            # A single broken streamer must not stop the startup of the others
+            logger.error(
+                f"Error while loading the data of {streamer.username}", exc_info=True
+            )
+        return True
+
+    def report(self) -> str:
+        return ", ".join(
+            f"{name}: {seconds:.2f}s" for name, seconds in self.timings.items()
+        )
@@ -0,0 +1,81 @@
+import json
+import logging
+import os
+from pathlib import Path
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+
+class ChannelIdCache(object):
+    """
+    Persistent username -> channel_id map (the id of a channel never changes).
+    Stored as JSON in the cache/ folder, next to cookies/, and shared by all the accounts.
+    """
+
+    __slots__ = ["path", "dirty", "__ids", "__lock"]
+
+    def __init__(self, path: str = None):
+        if path is None:
+            cache_path = os.path.join(Path().absolute(), "cache")
+            Path(cache_path).mkdir(parents=True, exist_ok=True)
+            path = os.path.join(cache_path, "channel_ids.json")
+        self.path = path
+        self.dirty = False
+        self.__ids = {}
+        self.__lock = Lock()
+        self.load()
+
+    @staticmethod
+    def __key(username: str) -> str:
+        return username.lower().strip()
+
+    def load(self):
+        if os.path.isfile(self.path) is False:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                ids = json.load(f)
+            if isinstance(ids, dict):
+                with self.__lock:
+                    self.__ids = {str(k): str(v) for k, v in ids.items()}
+                logger.debug(f"Loaded {len(self.__ids)} channel ids from {self.path}")
+        except (OSError, ValueError) as e:
+            # A corrupted cache is not a problem, the ids will be resolved again
+            logger.warning(f"Unable to load the channel ids cache: {e}")
+
+    def save(self):
+        with self.__lock:
+            if self.dirty is False:
+                return
+            ids = dict(self.__ids)
+            self.dirty = False
+        # Write to a temporary file and rename it, a crash never leaves a truncated cache
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(ids, f, indent=2, sort_keys=True)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Unable to save the channel ids cache: {e}")
+
+    def get(self, username: str):
+        return self.__ids.get(self.__key(username))
+
+    def set(self, username: str, channel_id: str):
+        key = self.__key(username)
+        with self.__lock:
+            if self.__ids.get(key) != str(channel_id):
+                self.__ids[key] = str(channel_id)
+                self.dirty = True
+
+    def invalidate(self, username: str):
+        with self.__lock:
+            if self.__ids.pop(self.__key(username), None) is not None:
+                self.dirty = True
+
+    def missing(self, usernames: list) -> list:
+        return [username for username in usernames if self.get(username) is None]
+
+    def __len__(self):
+        return len(self.__ids)
@@ -0,0 +1,132 @@
+import logging
+import re
+import time
+from threading import Lock, Thread
+
+import requests
+
+from TwitchChannelPointsMiner.classes.HTTPPool import HTTPPool
+from TwitchChannelPointsMiner.constants import CLIENT_VERSION, URL
+
+logger = logging.getLogger(__name__)
+
+
+class ClientVersion(object):
+    __slots__ = [
+        "version",
+        "ttl",
+        "min_refresh_interval",
+        "changes",
+        "last_update",
+        "running",
+        "twilight_build_id_pattern",
+        "http_pool",
+        "__lock",
+        "__refresher",
+    ]
+
+    def __init__(
+        self,
+        version=CLIENT_VERSION,
+        ttl=60 * 60,
+        min_refresh_interval=60,
+        http_pool: HTTPPool = None,
+    ):
+        self.version = version
+        # Twitch deploys a new build a few times per day, an hour is more than enough
+        self.ttl = ttl
+        # Prevent a storm of homepage downloads if many requests fail at the same time
+        self.min_refresh_interval = min_refresh_interval
+        # How many times the version has actually changed since the start
+        self.changes = 0
+        self.last_update = 0
+        self.running = True
+        self.twilight_build_id_pattern = re.compile(
+            r'window\.__twilightBuildID\s*=\s*"([0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12})"'
+        )
+        self.http_pool = HTTPPool.shared() if http_pool is None else http_pool
+        self.__lock = Lock()
+        self.__refresher = None
+
+    def get(self):
+        # Never block a GQL request for the homepage download, the refresher will do the job
+        if self.__refresher is None:
+            self.start()
+        return self.version
+
+    def start(self):
+        with self.__lock:
+            if self.__refresher is not None:
+                return
+            self.__refresher = Thread(target=self.__refresh_loop)
+            self.__refresher.daemon = True
+            self.__refresher.name = "Client version refresher"
+            self.__refresher.start()
+
+    def stop(self):
+        self.running = False
+
+    def expired(self):
+        return self.last_update == 0 or (time.time() - self.last_update) >= self.ttl
+
+    def __refresh_loop(self):
+        while self.running:
+            if self.expired():
+                self.refresh()
+            time.sleep(max(self.ttl - (time.time() - self.last_update), 1))
+
+    def refresh(self, force=False):
+        # Returns True only if the version has changed
+        with self.__lock:
+            if (
+                force is True
+                and (time.time() - self.last_update) < self.min_refresh_interval
+            ):
+                return False
+            if force is False and self.expired() is False:
+                return False
+
+            self.last_update = time.time()
+            try:
+                response = self.http_pool.get(URL)
+                if response.status_code != 200:
+                    logger.debug(
+                        f"Error with update_client_version: {response.status_code}"
+                    )
+                    return False
+                matcher = re.search(self.twilight_build_id_pattern, response.text)
+                if not matcher:
+                    logger.debug("Error with update_client_version: no match")
+                    return False
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Error with update_client_version: {e}")
+                return False
+
+            if matcher.group(1) == self.version:
+                return False
+
+            self.version = matcher.group(1)
+            self.changes += 1
+            logger.debug(
+                f"Client version: {self.version} (changed {self.changes} times)"
+            )
+            return True
+
+    @staticmethod
+    def is_mismatch(response):
+        # GQL answers with an error that mentions the Client-Version header when our build is outdated
+        if isinstance(response, list):
+            return any(ClientVersion.is_mismatch(item) for item in response)
+        if not isinstance(response, dict):
+            return False
+        errors = response.get("errors") or []
+        messages = [
+            str(error.get("message", "")) if isinstance(error, dict) else str(error)
+            for error in errors
+        ]
+        messages.append(str(response.get("message", "")))
+        messages.append(str(response.get("error", "")))
+        return any(
+            "client-version" in message.lower() or "client version" in message.lower()
+            for message in messages
+        )
@@ -1,20 +1,20 @@
 from textwrap import dedent
 
-import requests
-
+from TwitchChannelPointsMiner.classes.HTTPPool import HTTPPool
 from TwitchChannelPointsMiner.classes.Settings import Events
 
 
 class Discord(object):
-    __slots__ = ["webhook_api", "events"]
+    __slots__ = ["webhook_api", "events", "http_pool"]
 
-    def __init__(self, webhook_api: str, events: list):
+    def __init__(self, webhook_api: str, events: list, http_pool: HTTPPool = None):
         self.webhook_api = webhook_api
         self.events = [str(e) for e in events]
+        self.http_pool = HTTPPool.shared() if http_pool is None else http_pool
 
     def send(self, message: str, event: Events) -> None:
         if str(event) in self.events:
-            requests.post(
+            self.http_pool.post(
                 url=self.webhook_api,
                 data={
                     "content": dedent(message),
@@ -23,5 +23,4 @@ class Discord(object):
                         "https://avatars.githubusercontent.com/u/40718990"
                     ),
                 },
-                timeout=10,
             )
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class GQLBatcher(object):
+    """
+    Collect the GQL operations submitted within a short window (or up to max_batch_size)
+    and send them as a single POST with an array body. Every caller receives its own result.
+    An operation with a deadline still waiting for its POST after the deadline is dropped (empty result).
+    Runs on the event loop of AsyncClient: submit() is awaited from the loop, the window is a call_later.
+    """
+
+    __slots__ = [
+        "transport",
+        "window",
+        "max_batch_size",
+        "running",
+        "batches",
+        "operations",
+        "__queue",
+        "__flush",
+    ]
+
+    def __init__(self, transport, window=0.05, max_batch_size=20):
+        # transport(json_data, deadline) is a coroutine function,
+        # it must accept both a single operation and a list of operations
+        self.transport = transport
+        self.window = window
+        # Twitch rejects too large arrays, 20 is the size we have always used for campaigns
+        self.max_batch_size = max_batch_size
+        self.running = True
+        # Number of POST sent and number of operations sent with them
+        self.batches = 0
+        self.operations = 0
+        self.__queue = []
+        self.__flush = None
+
+    async def submit(self, json_data, deadline=None):
+        # deadline is a time.time() timestamp, None to wait as long as needed
+        if self.running is False:
+            return {}
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.__queue.append((json_data, future, deadline))
+        if len(self.__queue) >= self.max_batch_size:
+            self.__send_queue()
+        elif self.__flush is None:
+            # The window starts with the first operation of the batch
+            self.__flush = loop.call_later(self.window, self.__send_queue)
+        return await future
+
+    def stop(self):
+        # Thread safe: the operations still queued get an empty result instead of being sent
+        self.running = False
+
+    def __send_queue(self):
+        if self.__flush is not None:
+            self.__flush.cancel()
+            self.__flush = None
+        # Never more than max_batch_size operations: submit() sends a full queue right away
+        batch, self.__queue = self.__queue, []
+        if batch != []:
+            asyncio.ensure_future(self.__send(batch))
+
+    async def __send(self, batch):
+        if self.running is False:
+            # Nobody will send the pending operations anymore, don't leave the callers hanging
+            for _, future, _ in batch:
+                if future.done() is False:
+                    future.set_result({})
+            return
+
+        now = time.time()
+        expired = [item for item in batch if item[2] is not None and item[2] <= now]
+        if expired != []:
+            logger.warning(
+                f"{len(expired)} GQL operations missed their deadline, dropped from the batch"
+            )
+            for _, future, _ in expired:
+                if future.done() is False:
+                    future.set_result({})
+            batch = [item for item in batch if item[2] is None or item[2] > now]
+            if batch == []:
+                return
+        # The POST can wait as long as the most patient operation of the batch
+        deadlines = [deadline for _, _, deadline in batch]
+        deadline = None if None in deadlines else max(deadlines)
+
+        self.batches += 1
+        self.operations += len(batch)
+        try:
+            if len(batch) == 1:
+                results = [await self.transport(batch[0][0], deadline)]
+            else:
+                response = await self.transport(
+                    [json_data for json_data, _, _ in batch], deadline
+                )
+                if isinstance(response, list) and len(response) == len(batch):
+                    results = response
+                else:
+                    logger.debug(
+                        f"Unexpected response format for a batch of {len(batch)} operations"
+                    )
+                    results = [{}] * len(batch)
+        except Exception as e:
+            logger.error(f"Error while sending a batch of GQL operations: {e}")
+            results = [{}] * len(batch)
+
+        for (_, future, _), result in zip(batch, results):
+            # The caller may have been cancelled in the meantime
+            if future.done() is False:
+                future.set_result(result if result is not None else {})
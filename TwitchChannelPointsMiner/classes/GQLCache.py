@@ -0,0 +1,101 @@
+import logging
+import time
+from collections import OrderedDict
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+# Only the idempotent queries are cached, TTL in seconds
+OPERATIONS_TTL = {
+    # The channel id of a login never changes
+    "GetIDFromLogin": 24 * 60 * 60,
+    "ChannelPointsContext": 30,
+    "VideoPlayerStreamInfoOverlayChannel": 15,
+    "DropsHighlightService_AvailableDrops": 5 * 60,
+    "ViewerDropsDashboard": 5 * 60,
+}
+
+
+class GQLCache(object):
+    """
+    LRU cache with a TTL for each operation, keyed by operation and variables.
+    The cached responses are shared between the callers and must be considered read-only.
+    """
+
+    __slots__ = ["ttl", "max_size", "hits", "misses", "__entries", "__lock"]
+
+    def __init__(self, ttl: dict = None, max_size: int = 2048):
+        self.ttl = OPERATIONS_TTL if ttl is None else ttl
+        self.max_size = max_size
+        self.hits = {}
+        self.misses = {}
+        # key -> (operation_name, expire_at, response)
+        self.__entries = OrderedDict()
+        self.__lock = Lock()
+
+    def cacheable(self, json_data) -> bool:
+        return (
+            isinstance(json_data, list) is False
+            and json_data.operation_name in self.ttl
+        )
+
+    def get(self, json_data):
+        if self.cacheable(json_data) is False:
+            return None
+        operation_name = json_data.operation_name
+        key = json_data.encode()
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None and entry[1] > time.time():
+                self.__entries.move_to_end(key)
+                self.hits[operation_name] = self.hits.get(operation_name, 0) + 1
+                return entry[2]
+            if entry is not None:
+                del self.__entries[key]
+            self.misses[operation_name] = self.misses.get(operation_name, 0) + 1
+            return None
+
+    def set(self, json_data, response):
+        # Never cache the errors
+        if (
+            self.cacheable(json_data) is False
+            or isinstance(response, dict) is False
+            or response.get("data") is None
+            or response.get("errors")
+        ):
+            return
+        operation_name = json_data.operation_name
+        with self.__lock:
+            self.__entries[json_data.encode()] = (
+                operation_name,
+                time.time() + self.ttl[operation_name],
+                response,
+            )
+            self.__entries.move_to_end(json_data.encode())
+            while len(self.__entries) > self.max_size:
+                self.__entries.popitem(last=False)
+
+    def invalidate(self, operation, variables: dict = None):
+        # Called after a mutation. Without variables all the entries of the operation are removed
+        with self.__lock:
+            if variables is not None:
+                self.__entries.pop(operation.encode(variables), None)
+            else:
+                for key in [
+                    key
+                    for key, entry in self.__entries.items()
+                    if entry[0] == operation.operation_name
+                ]:
+                    del self.__entries[key]
+
+    def stats(self) -> dict:
+        stats = {}
+        for operation_name in sorted(set(self.hits) | set(self.misses)):
+            hits = self.hits.get(operation_name, 0)
+            misses = self.misses.get(operation_name, 0)
+            stats[operation_name] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / (hits + misses), 3),
+            }
+        return stats
@@ -0,0 +1,173 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from enum import Enum, auto
+
+logger = logging.getLogger(__name__)
+
+
+class GQLPriority(Enum):
+    # Lower value = served first
+    CRITICAL = auto()
+    HIGH = auto()
+    NORMAL = auto()
+    LOW = auto()
+
+    def __str__(self):
+        return self.name
+
+
+# Everything not listed here is NORMAL
+OPERATIONS_PRIORITY = {
+    "MakePrediction": GQLPriority.CRITICAL,
+    "ClaimCommunityPoints": GQLPriority.HIGH,
+    "CommunityMomentCallout_Claim": GQLPriority.HIGH,
+    "DropsPage_ClaimDropRewards": GQLPriority.HIGH,
+    "JoinRaid": GQLPriority.HIGH,
+    "ContributeCommunityPointsCommunityGoal": GQLPriority.HIGH,
+    "ChannelPointsContext": GQLPriority.LOW,
+    "UserPointsContribution": GQLPriority.LOW,
+    "Inventory": GQLPriority.LOW,
+    "ViewerDropsDashboard": GQLPriority.LOW,
+    "DropCampaignDetails": GQLPriority.LOW,
+    "DropsHighlightService_AvailableDrops": GQLPriority.LOW,
+    "ChannelFollows": GQLPriority.LOW,
+}
+
+
+class GQLScheduler(object):
+    """
+    Token bucket in front of the GQL endpoint.
+    When the bucket is empty the requests wait in a queue ordered by priority and then by deadline,
+    a request still waiting after its deadline is dropped.
+    Must be used only from the AsyncClient event loop.
+    """
+
+    __slots__ = [
+        "rate",
+        "burst",
+        "tokens",
+        "last_refill",
+        "granted",
+        "expired",
+        "waited",
+        "max_queue_depth",
+        "__queue",
+        "__sequence",
+        "__timer",
+    ]
+
+    def __init__(self, rate: float = 10, burst: int = 20):
+        # rate: tokens (POST) per second, burst: max tokens stored
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last_refill = time.monotonic()
+        # Metrics
+        self.granted = {priority: 0 for priority in GQLPriority}
+        self.expired = {priority: 0 for priority in GQLPriority}
+        self.waited = {priority: 0.0 for priority in GQLPriority}
+        self.max_queue_depth = 0
+        self.__queue = []
+        self.__sequence = itertools.count()
+        self.__timer = None
+
+    @staticmethod
+    def priority_of(json_data) -> GQLPriority:
+        # A batch is as important as its most important operation
+        if isinstance(json_data, list):
+            return min(
+                (GQLScheduler.priority_of(item) for item in json_data),
+                key=lambda priority: priority.value,
+                default=GQLPriority.NORMAL,
+            )
+        return OPERATIONS_PRIORITY.get(json_data.operation_name, GQLPriority.NORMAL)
+
+    def __refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.last_refill) * self.rate
+        )
+        self.last_refill = now
+
+    async def acquire(
+        self, priority: GQLPriority = GQLPriority.NORMAL, deadline=None
+    ) -> bool:
+        # deadline is a time.time() timestamp. Returns False if the deadline has been missed
+        self.__refill()
+        if self.__queue == [] and self.tokens >= 1:
+            self.tokens -= 1
+            self.granted[priority] += 1
+            return True
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(
+            self.__queue,
+            (
+                priority.value,
+                float("inf") if deadline is None else deadline,
+                next(self.__sequence),
+                priority,
+                time.monotonic(),
+                future,
+            ),
+        )
+        self.max_queue_depth = max(self.max_queue_depth, len(self.__queue))
+        if deadline is not None:
+            asyncio.get_running_loop().call_later(
+                max(deadline - time.time(), 0), self.__expire, priority, future
+            )
+        self.__schedule()
+        return await future
+
+    def __expire(self, priority, future):
+        # The item will be removed from the queue as soon as it reaches the top
+        if future.done() is False:
+            self.expired[priority] += 1
+            future.set_result(False)
+
+    def __schedule(self):
+        if self.__timer is None and self.__queue != []:
+            delay = max((1 - self.tokens) / self.rate, 0)
+            self.__timer = asyncio.get_running_loop().call_later(delay, self.__release)
+
+    def __release(self):
+        self.__timer = None
+        self.__refill()
+        while self.__queue != []:
+            _, _, _, priority, enqueued_at, future = self.__queue[0]
+            if future.done():
+                heapq.heappop(self.__queue)
+                continue
+            if self.tokens < 1:
+                break
+            heapq.heappop(self.__queue)
+            self.tokens -= 1
+            self.granted[priority] += 1
+            self.waited[priority] += time.monotonic() - enqueued_at
+            future.set_result(True)
+        self.__schedule()
+
+    def queue_depth(self) -> dict:
+        depth = {priority: 0 for priority in GQLPriority}
+        for item in self.__queue:
+            depth[item[3]] += 1
+        return depth
+
+    def stats(self) -> dict:
+        depth = self.queue_depth()
+        return {
+            str(priority): {
+                "granted": self.granted[priority],
+                "expired": self.expired[priority],
+                "queued": depth[priority],
+                "avg_wait": (
+                    round(self.waited[priority] / self.granted[priority], 3)
+                    if self.granted[priority] > 0
+                    else 0
+                ),
+            }
+            for priority in GQLPriority
+        }
@@ -1,23 +1,23 @@
 from textwrap import dedent
 
-import requests
-
+from TwitchChannelPointsMiner.classes.HTTPPool import HTTPPool
 from TwitchChannelPointsMiner.classes.Settings import Events
 
 class Gotify(object):
-    __slots__ = ["endpoint", "priority", "events"]
+    __slots__ = ["endpoint", "priority", "events", "http_pool"]
 
-    def __init__(self, endpoint: str, priority: int, events: list):
+    def __init__(self, endpoint: str, priority: int, events: list, http_pool: HTTPPool = None):
         self.endpoint = endpoint
         self.priority = priority
         self.events = [str(e) for e in events]
+        self.http_pool = HTTPPool.shared() if http_pool is None else http_pool
 
     def send(self, message: str, event: Events) -> None:
         if str(event) in self.events:
-            requests.post(
+            self.http_pool.post(
                 url=self.endpoint,
                 data={
                     "message": dedent(message),
                     "priority": self.priority
                 },
-            timeout=60)
+            )
@@ -0,0 +1,71 @@
+import json
+import logging
+import time
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+
+class HLSCache(object):
+    """
+    Playback chain of each broadcast: access token, signature and lowest quality variant playlist.
+    They stay valid for the whole broadcast, until the token expires.
+    """
+
+    __slots__ = ["default_ttl", "margin", "hits", "misses", "__entries", "__lock"]
+
+    def __init__(self, default_ttl: int = 10 * 60, margin: int = 60):
+        # Used when the token doesn't tell us its expiration
+        self.default_ttl = default_ttl
+        # Renew the token a bit before it expires
+        self.margin = margin
+        self.hits = 0
+        self.misses = 0
+        # broadcast_id -> {"signature", "token", "variant_url", "expires_at"}
+        self.__entries = {}
+        self.__lock = Lock()
+
+    def get(self, broadcast_id):
+        if broadcast_id is None:
+            return None
+        with self.__lock:
+            entry = self.__entries.get(broadcast_id)
+            if entry is not None and entry["expires_at"] - self.margin > time.time():
+                self.hits += 1
+                return entry
+            self.__entries.pop(broadcast_id, None)
+            self.misses += 1
+            return None
+
+    def set(self, broadcast_id, signature: str, token: str, variant_url: str):
+        if broadcast_id is None:
+            return
+        with self.__lock:
+            # Drop the broadcasts already ended, they will never be asked again
+            now = time.time()
+            for key in [
+                key
+                for key, entry in self.__entries.items()
+                if entry["expires_at"] <= now
+            ]:
+                del self.__entries[key]
+            self.__entries[broadcast_id] = {
+                "signature": signature,
+                "token": token,
+                "variant_url": variant_url,
+                "expires_at": self.expires_at(token),
+            }
+
+    def invalidate(self, broadcast_id):
+        with self.__lock:
+            self.__entries.pop(broadcast_id, None)
+
+    def expires_at(self, token: str) -> float:
+        # The token is a JSON document with an "expires" unix timestamp
+        try:
+            expires = json.loads(token).get("expires")
+            if isinstance(expires, (int, float)) and expires > 0:
+                return float(expires)
+        except (ValueError, AttributeError):
+            pass
+        return time.time() + self.default_ttl
@@ -0,0 +1,121 @@
+import logging
+from threading import Lock
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+"""
+Keep-alive connection pools for every host we talk to.
+Rules are matched on the exact hostname first, then on the parent domains (usher.ttvnw.net -> ttvnw.net).
+- pool_maxsize: max number of connections kept alive for each host
+- timeout: default timeout (seconds) if the caller doesn't provide one
+"""
+HOSTS = {
+    "gql.twitch.tv": {"pool_maxsize": 10, "timeout": 60},
+    "usher.ttvnw.net": {"pool_maxsize": 4, "timeout": 20},
+    # Video edges: playlists, segments and the spade endpoint
+    "ttvnw.net": {"pool_maxsize": 4, "timeout": 20},
+    "spade.twitch.tv": {"pool_maxsize": 4, "timeout": 20},
+    "www.twitch.tv": {"pool_maxsize": 2, "timeout": 60},
+    "twitch.tv": {"pool_maxsize": 2, "timeout": 60},
+    "twitchcdn.net": {"pool_maxsize": 2, "timeout": 60},
+    "discord.com": {"pool_maxsize": 2, "timeout": 10},
+    "discordapp.com": {"pool_maxsize": 2, "timeout": 10},
+}
+DEFAULT_HOST = {"pool_maxsize": 2, "timeout": 60}
+
+
+class HTTPPool(object):
+    __slots__ = ["hosts", "default", "__sessions", "__lock"]
+
+    __shared = None
+    __shared_lock = Lock()
+
+    def __init__(self, hosts: dict = None, default: dict = None):
+        self.hosts = HOSTS if hosts is None else hosts
+        self.default = DEFAULT_HOST if default is None else default
+        self.__sessions = {}
+        self.__lock = Lock()
+
+    @classmethod
+    def shared(cls):
+        # One pool for the whole process: the miner, the notifiers and the utils
+        # Reached from several threads at startup (bootstrap workers, notifiers)
+        if cls.__shared is None:
+            with cls.__shared_lock:
+                if cls.__shared is None:
+                    cls.__shared = cls()
+        return cls.__shared
+
+    def __rule(self, host):
+        parts = host.split(".")
+        for i in range(0, len(parts) - 1):
+            domain = ".".join(parts[i:])
+            if domain in self.hosts:
+                return domain, self.hosts[domain]
+        return None, self.default
+
+    def __session(self, rule_name, rule):
+        session = self.__sessions.get(rule_name)
+        if session is None:
+            with self.__lock:
+                session = self.__sessions.get(rule_name)
+                if session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(
+                        # Number of hosts (pools) cached for this rule
+                        pool_connections=20,
+                        pool_maxsize=rule.get(
+                            "pool_maxsize", self.default["pool_maxsize"]
+                        ),
+                    )
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self.__sessions[rule_name] = session
+        return session
+
+    def timeout(self, url):
+        _, rule = self.__rule(urlparse(url).hostname or "")
+        return rule.get("timeout", self.default["timeout"])
+
+    def request(self, method, url, **kwargs):
+        rule_name, rule = self.__rule(urlparse(url).hostname or "")
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = rule.get("timeout", self.default["timeout"])
+        return self.__session(rule_name, rule).request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request("HEAD", url, **kwargs)
+
+    def stats(self) -> dict:
+        # requests: total requests sent, connections: new TCP/TLS connections opened
+        stats = {}
+        for session in list(self.__sessions.values()):
+            for adapter in set(session.adapters.values()):
+                pools = adapter.poolmanager.pools
+                for key in list(pools.keys()):
+                    pool = pools.get(key)
+                    if pool is None:
+                        continue
+                    host = stats.setdefault(
+                        pool.host, {"requests": 0, "connections": 0, "reused": 0}
+                    )
+                    host["requests"] += pool.num_requests
+                    host["connections"] += pool.num_connections
+                    host["reused"] += max(pool.num_requests - pool.num_connections, 0)
+        return stats
+
+    def close(self):
+        with self.__lock:
+            for session in self.__sessions.values():
+                session.close()
+            self.__sessions = {}
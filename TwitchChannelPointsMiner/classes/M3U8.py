@@ -0,0 +1,107 @@
+import logging
+import re
+from collections import OrderedDict
+from threading import Lock
+from urllib.parse import urljoin
+
+logger = logging.getLogger(__name__)
+
+# KEY=VALUE or KEY="VALUE, with commas"
+ATTRIBUTE_PATTERN = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+
+class M3U8(object):
+    """
+    Minimal HLS playlist parser, only what the watch loop needs:
+    the cheapest variant of a master playlist and the newest segment of a media playlist.
+    The media playlists are parsed again only when their media sequence has changed.
+    """
+
+    __slots__ = ["max_playlists", "parsed", "reused", "__segments", "__lock"]
+
+    def __init__(self, max_playlists: int = 64):
+        # A playlist url lives as long as its token: keep only the most recently used ones
+        self.max_playlists = max_playlists
+        self.parsed = 0
+        self.reused = 0
+        # playlist url -> (media sequence, newest segment url), least recently used first
+        self.__segments = OrderedDict()
+        self.__lock = Lock()
+
+    @staticmethod
+    def parse_attributes(line: str) -> dict:
+        attributes = line.split(":", 1)[1] if ":" in line else ""
+        return {
+            key: value.strip('"')
+            for key, value in re.findall(ATTRIBUTE_PATTERN, attributes)
+        }
+
+    @staticmethod
+    def lowest_variant(text: str, base_url: str = None):
+        # URL of the video variant with the lowest BANDWIDTH, None if the playlist has no variant.
+        # The audio only variant is used only if there is nothing else, it may not count as watching
+        lowest = {}
+        attributes = None
+        for line in text.splitlines():
+            line = line.strip()
+            if line.startswith("#EXT-X-STREAM-INF:"):
+                attributes = M3U8.parse_attributes(line)
+            elif line != "" and line.startswith("#") is False:
+                # The URI always follows its #EXT-X-STREAM-INF
+                if attributes is not None and attributes.get("BANDWIDTH", "").isdigit():
+                    bandwidth = int(attributes["BANDWIDTH"])
+                    kind = "video" if "RESOLUTION" in attributes else "audio"
+                    if kind not in lowest or bandwidth < lowest[kind][1]:
+                        lowest[kind] = (line, bandwidth)
+                attributes = None
+        variant = lowest.get("video", lowest.get("audio"))
+        if variant is None:
+            return None
+        return urljoin(base_url, variant[0]) if base_url is not None else variant[0]
+
+    def newest_segment(self, text: str, url: str = None):
+        # URL of the last complete segment, None if the playlist has no segment
+        lines = text.splitlines()
+        media_sequence = None
+        for line in lines:
+            if line.startswith("#EXT-X-MEDIA-SEQUENCE:"):
+                media_sequence = line.split(":", 1)[1].strip()
+                break
+            if line.startswith("#EXTINF:"):
+                break
+
+        with self.__lock:
+            cached = self.__segments.get(url)
+            if cached is not None:
+                self.__segments.move_to_end(url)
+        if (
+            cached is not None
+            and media_sequence is not None
+            and cached[0] == media_sequence
+        ):
+            self.reused += 1
+            return cached[1]
+
+        segment, expect_uri = None, False
+        for line in lines:
+            line = line.strip()
+            if line.startswith("#EXTINF:"):
+                expect_uri = True
+            elif expect_uri is True and line != "" and line.startswith("#") is False:
+                segment, expect_uri = line, False
+        if segment is None:
+            return None
+        segment = urljoin(url, segment) if url is not None else segment
+
+        self.parsed += 1
+        if url is not None and media_sequence is not None:
+            with self.__lock:
+                self.__segments[url] = (media_sequence, segment)
+                self.__segments.move_to_end(url)
+                while len(self.__segments) > self.max_playlists:
+                    self.__segments.popitem(last=False)
+        return segment
+
+    def forget(self, url: str):
+        with self.__lock:
+            self.__segments.pop(url, None)
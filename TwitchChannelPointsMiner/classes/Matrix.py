@@ -1,28 +1,29 @@
 from textwrap import dedent
 
 import logging
-import requests
 from urllib.parse import quote
 
+from TwitchChannelPointsMiner.classes.HTTPPool import HTTPPool
 from TwitchChannelPointsMiner.classes.Settings import Events
 
 
 class Matrix(object):
-    __slots__ = ["access_token", "homeserver", "room_id", "events"]
+    __slots__ = ["access_token", "homeserver", "room_id", "events", "http_pool"]
 
-    def __init__(self, username: str, password: str, homeserver: str, room_id: str, events: list):
+    def __init__(self, username: str, password: str, homeserver: str, room_id: str, events: list, http_pool: HTTPPool = None):
         self.homeserver = homeserver
         self.room_id = quote(room_id)
         self.events = [str(e) for e in events]
+        self.http_pool = HTTPPool.shared() if http_pool is None else http_pool
 
-        body = requests.post(
+        body = self.http_pool.post(
             url=f"https://{self.homeserver}/_matrix/client/r0/login",
             json={
                 "user": username,
                 "password": password,
                 "type": "m.login.password"
-            }, 
-        timeout=60).json()
+            },
+        ).json()
 
         self.access_token = body.get("access_token")
 
@@ -31,10 +32,10 @@ class Matrix(object):
 
     def send(self, message: str, event: Events) -> None:
         if str(event) in self.events:
-            requests.post(
+            self.http_pool.post(
                 url=f"https://{self.homeserver}/_matrix/client/r0/rooms/{self.room_id}/send/m.room.message?access_token={self.access_token}",
                 json={
                     "body": dedent(message),
                     "msgtype": "m.text"
-                }, 
-            timeout=60)
+                },
+            )
@@ -1,23 +1,23 @@
 from textwrap import dedent
 
-import requests
-
+from TwitchChannelPointsMiner.classes.HTTPPool import HTTPPool
 from TwitchChannelPointsMiner.classes.Settings import Events
 
 
 class Pushover(object):
-    __slots__ = ["userkey", "token", "priority", "sound", "events"]
+    __slots__ = ["userkey", "token", "priority", "sound", "events", "http_pool"]
 
-    def __init__(self, userkey: str, token: str, priority, sound, events: list):
+    def __init__(self, userkey: str, token: str, priority, sound, events: list, http_pool: HTTPPool = None):
         self.userkey = userkey
         self.token = token
         self. priority = priority
         self.sound = sound
         self.events = [str(e) for e in events]
+        self.http_pool = HTTPPool.shared() if http_pool is None else http_pool
 
     def send(self, message: str, event: Events) -> None:
         if str(event) in self.events:
-            requests.post(
+            self.http_pool.post(
                 url="https://api.pushover.net/1/messages.json",
                 data={
                     "user": self.userkey,
@@ -27,4 +27,4 @@ class Pushover(object):
                     "priority": self.priority,
                     "sound": self.sound,
                 },
-            timeout=60)
+            )
@@ -18,6 +18,18 @@ class FollowersOrder(Enum):
         return self.name
 
 
+class StreamState(Enum):
+    OFFLINE = auto()
+    # stream-up received, the API doesn't report the stream yet
+    STARTING = auto()
+    ONLINE = auto()
+    # stream-down received, the API may still report the stream
+    ENDING = auto()
+
+    def __str__(self):
+        return self.name
+
+
 # Empty object shared between class
 class Settings(object):
     __slots__ = ["logger", "streamer_settings",
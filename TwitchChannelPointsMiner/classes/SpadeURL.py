@@ -0,0 +1,141 @@
+import logging
+import re
+import time
+from threading import Lock, Thread
+
+import requests
+
+from TwitchChannelPointsMiner.classes.HTTPPool import HTTPPool
+from TwitchChannelPointsMiner.constants import URL, USER_AGENTS
+
+logger = logging.getLogger(__name__)
+
+
+class SpadeURL(object):
+    """
+    The spade (minute-watched) endpoint is the same for every channel.
+    Resolved once from a channel page + the settings JS file, then refreshed in background every ttl seconds
+    or immediately when a minute-watched request is rejected.
+    """
+
+    __slots__ = [
+        "url",
+        "page_url",
+        "ttl",
+        "min_refresh_interval",
+        "fetches",
+        "changes",
+        "last_update",
+        "last_attempt",
+        "running",
+        "settings_pattern",
+        "spade_pattern",
+        "http_pool",
+        "__lock",
+        "__refresher",
+    ]
+
+    def __init__(
+        self,
+        ttl=6 * 60 * 60,
+        min_refresh_interval=60,
+        http_pool: HTTPPool = None,
+    ):
+        self.url = None
+        # Any channel page works, the first streamer that goes online provides it
+        self.page_url = URL
+        self.ttl = ttl
+        # Many rejected minute-watched at the same time must cause only one download
+        self.min_refresh_interval = min_refresh_interval
+        self.fetches = 0
+        self.changes = 0
+        # Last successful resolve, and last download (successful or not)
+        self.last_update = 0
+        self.last_attempt = 0
+        self.running = True
+        self.settings_pattern = re.compile(
+            "(https://static.twitchcdn.net/config/settings.*?js|https://assets.twitch.tv/config/settings.*?.js)"
+        )
+        self.spade_pattern = re.compile('"spade_url":"(.*?)"')
+        self.http_pool = HTTPPool.shared() if http_pool is None else http_pool
+        self.__lock = Lock()
+        self.__refresher = None
+
+    def get(self, page_url=None):
+        # Blocks only the very first time, when we don't have any value yet
+        if page_url is not None:
+            self.page_url = page_url
+        if self.url is None:
+            self.refresh()
+        if self.__refresher is None:
+            self.start()
+        return self.url
+
+    def start(self):
+        with self.__lock:
+            if self.__refresher is not None:
+                return
+            self.__refresher = Thread(target=self.__refresh_loop)
+            self.__refresher.daemon = True
+            self.__refresher.name = "Spade URL refresher"
+            self.__refresher.start()
+
+    def stop(self):
+        self.running = False
+
+    def expired(self):
+        return self.last_update == 0 or (time.time() - self.last_update) >= self.ttl
+
+    def __refresh_loop(self):
+        while self.running:
+            if self.expired():
+                self.refresh()
+            if self.url is None:
+                # Never resolved: retry soon, the minute-watched events can't be sent without it
+                time.sleep(self.min_refresh_interval)
+            else:
+                time.sleep(max(self.ttl - (time.time() - self.last_update), 1))
+
+    def refresh(self, force=False):
+        # Returns True only if the url has changed
+        with self.__lock:
+            if (time.time() - self.last_attempt) < self.min_refresh_interval:
+                return False
+            if force is False and self.expired() is False:
+                return False
+
+            self.last_attempt = time.time()
+            self.fetches += 1
+            # fixes AttributeError: 'NoneType' object has no attribute 'group'
+            headers = {"User-Agent": USER_AGENTS["Linux"]["FIREFOX"]}
+            try:
+                response = self.http_pool.get(self.page_url, headers=headers)
+                settings_url = re.search(self.settings_pattern, response.text)
+                if settings_url is None:
+                    logger.error(
+                        "Something went wrong during extraction of 'spade_url': settings not found"
+                    )
+                    return False
+
+                response = self.http_pool.get(settings_url.group(1), headers=headers)
+                spade_url = re.search(self.spade_pattern, response.text)
+                if spade_url is None:
+                    logger.error(
+                        "Something went wrong during extraction of 'spade_url': spade_url not found"
+                    )
+                    return False
+            except requests.exceptions.RequestException as e:
+                logger.error(
+                    f"Something went wrong during extraction of 'spade_url': {e}"
+                )
+                return False
+
+            # Only a parsed url counts as a resolve: a failure is retried after min_refresh_interval
+            self.last_update = time.time()
+            if spade_url.group(1) == self.url:
+                return False
+
+            self.changes += 0 if self.url is None else 1
+            self.url = spade_url.group(1)
+            logger.debug(f"Spade URL: {self.url}")
+            return True
@@ -0,0 +1,196 @@
+import logging
+import time
+from threading import Lock
+
+from TwitchChannelPointsMiner.classes.Exceptions import StreamerIsOfflineException
+from TwitchChannelPointsMiner.classes.Settings import StreamState
+
+logger = logging.getLogger(__name__)
+
+# Allowed transitions, anything else is ignored
+TRANSITIONS = {
+    StreamState.OFFLINE: [StreamState.STARTING, StreamState.ONLINE],
+    StreamState.STARTING: [StreamState.ONLINE, StreamState.OFFLINE],
+    StreamState.ONLINE: [StreamState.ENDING, StreamState.OFFLINE],
+    # A new stream-up (restart), or the stream-down was not the end of the stream
+    StreamState.ENDING: [StreamState.OFFLINE, StreamState.STARTING, StreamState.ONLINE],
+}
+
+
+class StreamMonitor(object):
+    """
+    Online state of the streamers: OFFLINE -> STARTING -> ONLINE -> ENDING -> OFFLINE.
+    The PubSub events (stream-up, stream-down, viewcount) drive the transitions, the stream info (GQL) is only requested
+    to confirm a transition or to refresh an online stream. The API lags behind the events, hence the grace periods:
+    a stream is checked starting_grace seconds after stream-up, and not before ending_grace seconds after stream-down.
+    poll() is the fallback of the watch loop for the events that never come.
+    The listeners are called on every transition with (streamer, previous, state), under the lock: they must be quick.
+    """
+
+    __slots__ = [
+        "twitch",
+        "starting_grace",
+        "ending_grace",
+        "refresh_interval",
+        "stale_interval",
+        "checks",
+        "transitions",
+        "listeners",
+        "__pending",
+        "__checked_at",
+        "__lock",
+    ]
+
+    def __init__(
+        self,
+        twitch,
+        starting_grace: int = 120,
+        ending_grace: int = 60,
+        refresh_interval: int = 5 * 60,
+        stale_interval: int = 10 * 60,
+    ):
+        self.twitch = twitch
+        self.starting_grace = starting_grace
+        self.ending_grace = ending_grace
+        # Stream info refreshed on viewcount at most once every refresh_interval seconds (online or offline)
+        self.refresh_interval = refresh_interval
+        # No refresh for stale_interval seconds (no viewcount, WebSocket down): poll() checks the stream
+        self.stale_interval = stale_interval
+        # Stream info requests
+        self.checks = 0
+        # (from, to) -> count
+        self.transitions = {}
+        self.listeners = []
+        # Streamers in STARTING or ENDING, the ones poll() has to look at
+        self.__pending = set()
+        # Last stream info request of each streamer
+        self.__checked_at = {}
+        self.__lock = Lock()
+
+    # === EVENTS === #
+
+    def stream_up(self, streamer):
+        with self.__lock:
+            if streamer.state in [StreamState.OFFLINE, StreamState.ENDING]:
+                self.__transition(streamer, StreamState.STARTING)
+
+    def stream_down(self, streamer):
+        with self.__lock:
+            if streamer.state == StreamState.ONLINE:
+                self.__transition(streamer, StreamState.ENDING)
+            elif streamer.state == StreamState.STARTING:
+                self.__transition(streamer, StreamState.OFFLINE)
+        self.twitch.watch_selector.update(streamer)
+
+    def viewcount(self, streamer):
+        # The stream is live, but the API may not know it yet
+        if self.__check_required(streamer, time.time()) is True:
+            self.check(streamer)
+
+    def __check_required(self, streamer, now) -> bool:
+        elapsed = now - streamer.state_at
+        if streamer.state == StreamState.OFFLINE:
+            # stream-up missed (the stream started before us), unless the API said offline a moment ago
+            return now - self.__checked_at.get(streamer, 0) >= self.refresh_interval
+        if streamer.state == StreamState.STARTING:
+            return elapsed >= self.starting_grace
+        if streamer.state == StreamState.ENDING:
+            return elapsed >= self.ending_grace
+        return streamer.stream.update_elapsed() >= self.refresh_interval
+
+    # === STREAM INFO === #
+
+    def check(self, streamer):
+        # Ask the API and move to the state it reports
+        state = streamer.state
+        if (
+            state == StreamState.ENDING
+            and time.time() - streamer.state_at < self.ending_grace
+        ):
+            return
+
+        self.checks += 1
+        self.__checked_at[streamer] = time.time()
+        try:
+            if state != StreamState.ONLINE:
+                self.twitch.get_spade_url(streamer)
+            online = self.twitch.update_stream(streamer, force=True)
+        except StreamerIsOfflineException:
+            online = False
+        else:
+            if online is False:
+                # The request failed: no answer is not an online stream, keep the state until the next check
+                logger.debug(f"{streamer}: no stream info, state unchanged ({state})")
+                return
+
+        with self.__lock:
+            if online is True:
+                self.__transition(streamer, StreamState.ONLINE)
+            elif streamer.state == StreamState.OFFLINE and streamer.state_at == 0:
+                # First check (startup), nothing changes but it's worth a log
+                streamer.state_at = time.time()
+                streamer.set_offline()
+            elif streamer.state == StreamState.STARTING and (
+                time.time() - streamer.state_at < self.starting_grace
+            ):
+                # Too early, poll() will check again at the end of the grace period
+                pass
+            else:
+                self.__transition(streamer, StreamState.OFFLINE)
+        self.twitch.watch_selector.update(streamer)
+
+    def poll(self, online: list):
+        # Fallback timers, called by the watch loop with the streamers online
+        now = time.time()
+        for streamer in online:
+            if streamer.stream.update_elapsed() > self.stale_interval:
+                # Why this user It's currently online but the last updated was more than 10minutes ago?
+                # Please perform a manually update and check if the user it's online
+                self.check(streamer)
+        with self.__lock:
+            pending = list(self.__pending)
+        for streamer in pending:
+            if streamer.state == StreamState.ENDING:
+                if now - streamer.state_at >= self.ending_grace:
+                    # The stream-down was right, nothing to ask
+                    with self.__lock:
+                        if streamer.state == StreamState.ENDING:
+                            self.__transition(streamer, StreamState.OFFLINE)
+            elif self.__check_required(streamer, now) is True:
+                self.check(streamer)
+
+    # === TRANSITIONS === #
+
+    def __transition(self, streamer, state) -> bool:
+        previous = streamer.state
+        if previous == state:
+            return False
+        if state not in TRANSITIONS[previous]:
+            logger.debug(f"{streamer}: ignored transition {previous} → {state}")
+            return False
+
+        streamer.state = state
+        streamer.state_at = time.time()
+        self.transitions[(previous, state)] = (
+            self.transitions.get((previous, state), 0) + 1
+        )
+        if state in [StreamState.STARTING, StreamState.ENDING]:
+            self.__pending.add(streamer)
+        else:
+            self.__pending.discard(streamer)
+        logger.debug(f"{streamer}: {previous} → {state}")
+
+        if state == StreamState.ONLINE:
+            streamer.set_online()
+        elif previous == StreamState.ONLINE:
+            streamer.set_offline()
+        for listener in self.listeners:
+            listener(streamer, previous, state)
+        return True
+
+    def stats(self) -> dict:
+        with self.__lock:
+            return {
+                f"{previous} → {state}": count
+                for (previous, state), count in self.transitions.items()
+            }
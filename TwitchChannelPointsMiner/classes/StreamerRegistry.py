@@ -0,0 +1,112 @@
+import logging
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+
+class StreamerRegistry(object):
+    """
+    The streamers followed by the miner, indexed by handle, channel_id and login.
+    A handle is an integer given by add() and never reused, it stays valid (and keeps the insertion order) when other streamers are added or removed.
+    add/remove can be called from any thread: they take the lock, and so does the iteration (on a snapshot).
+    The lookups don't, a single dict read is atomic.
+    """
+
+    __slots__ = [
+        "__next_handle",
+        "__streamers",
+        "__handles",
+        "__keys",
+        "__by_channel_id",
+        "__by_login",
+        "__lock",
+    ]
+
+    def __init__(self, streamers: list = None):
+        self.__next_handle = 0
+        # handle -> streamer, in insertion order
+        self.__streamers = {}
+        # id(streamer) -> handle
+        self.__handles = {}
+        # handle -> (channel_id, login) it is indexed with
+        self.__keys = {}
+        self.__by_channel_id = {}
+        self.__by_login = {}
+        self.__lock = Lock()
+        for streamer in streamers or []:
+            self.add(streamer)
+
+    @staticmethod
+    def __login(login: str) -> str:
+        return login.lower().strip()
+
+    def add(self, streamer) -> int:
+        with self.__lock:
+            handle = self.__handles.get(id(streamer))
+            if handle is not None:
+                return handle
+            handle = self.__next_handle
+            self.__next_handle += 1
+
+            channel_id = (
+                None if streamer.channel_id in ["", None] else str(streamer.channel_id)
+            )
+            login = self.__login(streamer.username)
+            self.__keys[handle] = (channel_id, login)
+            if channel_id is not None:
+                self.__by_channel_id[channel_id] = handle
+            self.__by_login[login] = handle
+            self.__handles[id(streamer)] = handle
+            self.__streamers[handle] = streamer
+            return handle
+
+    def remove(self, streamer) -> bool:
+        with self.__lock:
+            handle = self.__handles.pop(id(streamer), None)
+            if handle is None:
+                return False
+            del self.__streamers[handle]
+            channel_id, login = self.__keys.pop(handle)
+            if self.__by_channel_id.get(channel_id) == handle:
+                del self.__by_channel_id[channel_id]
+            if self.__by_login.get(login) == handle:
+                del self.__by_login[login]
+            return True
+
+    # === LOOKUPS === #
+
+    def get(self, handle: int):
+        return self.__streamers.get(handle)
+
+    def handle(self, streamer):
+        return self.__handles.get(id(streamer))
+
+    def by_channel_id(self, channel_id):
+        handle = self.__by_channel_id.get(str(channel_id))
+        return None if handle is None else self.__streamers.get(handle)
+
+    def by_login(self, login: str):
+        handle = self.__by_login.get(self.__login(login))
+        return None if handle is None else self.__streamers.get(handle)
+
+    def handles(self) -> list:
+        with self.__lock:
+            return list(self.__streamers)
+
+    def items(self) -> list:
+        # (handle, streamer) pairs, in insertion order
+        with self.__lock:
+            return list(self.__streamers.items())
+
+    def __getitem__(self, handle: int):
+        return self.__streamers[handle]
+
+    def __contains__(self, streamer) -> bool:
+        return id(streamer) in self.__handles
+
+    def __iter__(self):
+        with self.__lock:
+            return iter(list(self.__streamers.values()))
+
+    def __len__(self) -> int:
+        return len(self.__streamers)
@@ -1,24 +1,35 @@
 from textwrap import dedent
 
-import requests
-
+from TwitchChannelPointsMiner.classes.HTTPPool import HTTPPool
 from TwitchChannelPointsMiner.classes.Settings import Events
 
 
 class Telegram(object):
-    __slots__ = ["chat_id", "telegram_api", "events", "disable_notification"]
+    __slots__ = [
+        "chat_id",
+        "telegram_api",
+        "events",
+        "disable_notification",
+        "http_pool",
+    ]
 
     def __init__(
-        self, chat_id: int, token: str, events: list, disable_notification: bool = False
+        self,
+        chat_id: int,
+        token: str,
+        events: list,
+        disable_notification: bool = False,
+        http_pool: HTTPPool = None,
     ):
         self.chat_id = chat_id
         self.telegram_api = f"https://api.telegram.org/bot{token}/sendMessage"
         self.events = [str(e) for e in events]
         self.disable_notification = disable_notification
+        self.http_pool = HTTPPool.shared() if http_pool is None else http_pool
 
     def send(self, message: str, event: Events) -> None:
         if str(event) in self.events:
-            requests.post(
+            self.http_pool.post(
                 url=self.telegram_api,
                 data={
                     "chat_id": self.chat_id,
@@ -26,4 +37,4 @@ class Telegram(object):
                     "disable_web_page_preview": True,  # include link to twitch streamer?
                     "disable_notification": self.disable_notification,  # no sound, notif just in tray
                 },
-            timeout=60)
+            )
@@ -0,0 +1,68 @@
+import logging
+
+from TwitchChannelPointsMiner.classes.Settings import StreamState
+
+logger = logging.getLogger(__name__)
+
+# Twitch limits: 50 topics per connection, no more than 10 connections per IP address
+TOPICS_PER_CONNECTION = 50
+MAX_CONNECTIONS = 10
+
+# Order of the channel topics of a streamer, the most useful first
+CHANNEL_TOPICS = [
+    "video-playback-by-id",
+    "predictions-channel-v1",
+    "community-moments-channel-v1",
+    "raid",
+    "community-points-channel-v1",
+]
+
+
+class TopicPlanner(object):
+    """
+    Chooses the PubSub topics to listen when they don't all fit in max_connections connections.
+    Ranking: the user topics, then the topics of the live streamers (starting, online or ending: a raid comes at the end),
+    then video-playback-by-id of the offline streamers (to see them going online), then the rest.
+    Inside a rank, the streamers keep the order of the registry (the order of the run file).
+    """
+
+    __slots__ = ["streamers", "max_connections", "topics_per_connection"]
+
+    def __init__(
+        self,
+        streamers,
+        max_connections: int = MAX_CONNECTIONS,
+        topics_per_connection: int = TOPICS_PER_CONNECTION,
+    ):
+        # StreamerRegistry, for the order of the streamers
+        self.streamers = streamers
+        self.max_connections = max_connections
+        self.topics_per_connection = topics_per_connection
+
+    @property
+    def capacity(self) -> int:
+        return self.max_connections * self.topics_per_connection
+
+    def rank(self, topic) -> tuple:
+        if topic.is_user_topic():
+            return (0, 0, 0)
+        streamer = topic.streamer
+        kind = (
+            CHANNEL_TOPICS.index(topic.topic)
+            if topic.topic in CHANNEL_TOPICS
+            else len(CHANNEL_TOPICS)
+        )
+        handle = self.streamers.handle(streamer)
+        # Not in the registry yet (progressive startup): after the others
+        order = float("inf") if handle is None else handle
+        if streamer.state != StreamState.OFFLINE:
+            return (1, order, kind)
+        if topic.topic == "video-playback-by-id":
+            return (2, order, kind)
+        return (3, order, kind)
+
+    def plan(self, topics: list) -> tuple:
+        # Returns (topics to listen, topics over the budget), both sorted by rank
+        ranked = sorted(topics, key=self.rank)
+        capacity = self.capacity
+        return ranked[:capacity], ranked[capacity:]
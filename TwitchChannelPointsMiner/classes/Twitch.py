@@ -4,15 +4,14 @@
 # Full list of available methods: https://azr.ivr.fi/schema/query.doc.html (a bit outdated)
 
 
-import copy
+import asyncio
+import json
 import logging
 import os
-import re
 import string
 import time
+import aiohttp
 import requests
-import validators
-# import json
 
 from pathlib import Path
 from secrets import choice, token_hex
@@ -21,29 +20,40 @@ from typing import Dict, Any
 # from base64 import urlsafe_b64decode
 # from datetime import datetime
 
+from TwitchChannelPointsMiner.classes.AsyncClient import AsyncClient
+from TwitchChannelPointsMiner.classes.ChannelIdCache import ChannelIdCache
+from TwitchChannelPointsMiner.classes.ClientVersion import ClientVersion
 from TwitchChannelPointsMiner.classes.entities.Campaign import Campaign
 from TwitchChannelPointsMiner.classes.entities.CommunityGoal import CommunityGoal
 from TwitchChannelPointsMiner.classes.entities.Drop import Drop
+from TwitchChannelPointsMiner.classes.entities.Stream import Stream
 from TwitchChannelPointsMiner.classes.Exceptions import (
     StreamerDoesNotExistException,
     StreamerIsOfflineException,
 )
+from TwitchChannelPointsMiner.classes.GQLBatcher import GQLBatcher
+from TwitchChannelPointsMiner.classes.GQLCache import GQLCache
+from TwitchChannelPointsMiner.classes.GQLScheduler import GQLScheduler
+from TwitchChannelPointsMiner.classes.HLSCache import HLSCache
+from TwitchChannelPointsMiner.classes.HTTPPool import HTTPPool
+from TwitchChannelPointsMiner.classes.M3U8 import M3U8
 from TwitchChannelPointsMiner.classes.Settings import (
     Events,
     FollowersOrder,
-    Priority,
     Settings,
 )
+from TwitchChannelPointsMiner.classes.SpadeURL import SpadeURL
+from TwitchChannelPointsMiner.classes.StreamMonitor import StreamMonitor
 from TwitchChannelPointsMiner.classes.TwitchLogin import TwitchLogin
+from TwitchChannelPointsMiner.classes.WatchJitter import WatchJitter
+from TwitchChannelPointsMiner.classes.WatchSelector import WatchSelector
 from TwitchChannelPointsMiner.constants import (
     CLIENT_ID,
-    CLIENT_VERSION,
-    URL,
     GQLOperations,
+    GQLRequest,
 )
 from TwitchChannelPointsMiner.utils import (
     _millify,
-    create_chunks,
     internet_connection_available,
 )
 import secrets
@@ -51,6 +61,16 @@ import secrets
 logger = logging.getLogger(__name__)
 JsonType = Dict[str, Any]
 
+# Operations with side effects, two identical calls must really be sent twice
+GQL_MUTATIONS = {
+    "ClaimCommunityPoints",
+    "CommunityMomentCallout_Claim",
+    "DropsPage_ClaimDropRewards",
+    "JoinRaid",
+    "MakePrediction",
+    "ContributeCommunityPointsCommunityGoal",
+}
+
 
 class Twitch(object):
     __slots__ = [
@@ -63,11 +83,29 @@ class Twitch(object):
         # "integrity_expire",
         "client_session",
         "client_version",
-        "twilight_build_id_pattern",
+        "http_pool",
+        "gql_batcher",
+        "async_client",
+        "gql_scheduler",
+        "gql_cache",
+        "gql_deduplicated",
+        "channel_ids",
+        "first_watch_at",
+        "spade_url",
+        "hls_cache",
+        "m3u8",
+        "watch_jitter",
+        "watch_selector",
+        "stream_monitor",
+        "__in_flight",
     ]
 
-    def __init__(self, username, user_agent, password=None):
-        cookies_path = os.path.join(Path().absolute(), "cookies")
+    def __init__(
+        self, username, user_agent, password=None, http_pool=None, data_path=None
+    ):
+        # cookies/ and cache/ are created in data_path, the working directory by default
+        data_path = Path().absolute() if data_path is None else data_path
+        cookies_path = os.path.join(data_path, "cookies")
         Path(cookies_path).mkdir(parents=True, exist_ok=True)
         self.cookies_file = os.path.join(cookies_path, f"{username}.pkl")
         self.user_agent = user_agent
@@ -81,10 +119,29 @@ class Twitch(object):
         # self.integrity = None
         # self.integrity_expire = 0
         self.client_session = token_hex(16)
-        self.client_version = CLIENT_VERSION
-        self.twilight_build_id_pattern = re.compile(
-            r'window\.__twilightBuildID\s*=\s*"([0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12})"'
-        )
+        self.http_pool = HTTPPool.shared() if http_pool is None else http_pool
+        self.client_version = ClientVersion(http_pool=self.http_pool)
+        self.async_client = AsyncClient(http_pool=self.http_pool)
+        self.gql_batcher = GQLBatcher(self.__send_gql)
+        self.gql_scheduler = GQLScheduler()
+        self.gql_cache = GQLCache()
+        # Single-flight: encoded body -> future of the request already in flight (used only from the loop)
+        self.gql_deduplicated = 0
+        self.__in_flight = {}
+        cache_path = os.path.join(data_path, "cache")
+        Path(cache_path).mkdir(parents=True, exist_ok=True)
+        self.channel_ids = ChannelIdCache(os.path.join(cache_path, "channel_ids.json"))
+        # Timestamp of the first minute watched sent successfully (time-to-first-watch)
+        self.first_watch_at = None
+        self.spade_url = SpadeURL(http_pool=self.http_pool)
+        self.hls_cache = HLSCache()
+        self.m3u8 = M3U8()
+        # Each watched channel gets a minute-watched event every 20 seconds
+        self.watch_jitter = WatchJitter(interval=20)
+        # Candidates to watch, updated by every method that changes a streamer
+        self.watch_selector = WatchSelector()
+        # Online state of the streamers, driven by the PubSub events
+        self.stream_monitor = StreamMonitor(self)
 
     def login(self):
         if not os.path.isfile(self.cookies_file):
@@ -95,8 +152,10 @@ class Twitch(object):
             self.twitch_login.set_token(self.twitch_login.get_auth_token())
 
     # === STREAMER / STREAM / INFO === #
-    def update_stream(self, streamer):
-        if streamer.stream.update_required() is True:
+    def update_stream(self, streamer, force=False) -> bool:
+        # True if the stream info has been updated, False if not required or if the request failed
+        # Raises StreamerIsOfflineException
+        if force is True or streamer.stream.update_required() is True:
             stream_info = self.get_stream_info(streamer)
             if stream_info is not None:
                 streamer.stream.update(
@@ -131,34 +190,17 @@ class Twitch(object):
                 streamer.stream.payload = [
                     {"event": "minute-watched", "properties": event_properties}
                 ]
+                return True
+        return False
 
     def get_spade_url(self, streamer):
-        try:
-            # fixes AttributeError: 'NoneType' object has no attribute 'group'
-            # headers = {"User-Agent": self.user_agent}
-            from TwitchChannelPointsMiner.constants import USER_AGENTS
-
-            headers = {"User-Agent": USER_AGENTS["Linux"]["FIREFOX"]}
-
-            main_page_request = requests.get(
-                streamer.streamer_url, headers=headers, timeout=60)
-            response = main_page_request.text
-            # logger.info(response)
-            regex_settings = "(https://static.twitchcdn.net/config/settings.*?js|https://assets.twitch.tv/config/settings.*?.js)"
-            settings_url = re.search(regex_settings, response).group(1)
-
-            settings_request = requests.get(settings_url, headers=headers, timeout=60)
-            response = settings_request.text
-            regex_spade = '"spade_url":"(.*?)"'
-            streamer.stream.spade_url = re.search(
-                regex_spade, response).group(1)
-        except requests.exceptions.RequestException as e:
-            logger.error(
-                f"Something went wrong during extraction of 'spade_url': {e}")
+        # Shared by all the streamers, downloaded again only when expired or rejected
+        streamer.stream.spade_url = self.spade_url.get(streamer.streamer_url)
 
     def get_broadcast_id(self, streamer):
-        json_data = copy.deepcopy(GQLOperations.WithIsStreamLiveQuery)
-        json_data["variables"] = {"id": streamer.channel_id}
+        json_data = GQLOperations.WithIsStreamLiveQuery.request(
+            {"id": streamer.channel_id}
+        )
         response = self.post_gql_request(json_data)
         if response != {}:
             stream = response["data"]["user"]["stream"]
@@ -168,10 +210,10 @@ class Twitch(object):
                 raise StreamerIsOfflineException
 
     def get_stream_info(self, streamer):
-        json_data = copy.deepcopy(
-            GQLOperations.VideoPlayerStreamInfoOverlayChannel)
-        json_data["variables"] = {"channel": streamer.username}
-        response = self.post_gql_request(json_data)
+        json_data = GQLOperations.VideoPlayerStreamInfoOverlayChannel.request(
+            {"channel": streamer.username}
+        )
+        response = self.post_gql_request(json_data, batch=True)
         if response != {}:
             if response["data"]["user"]["stream"] is None:
                 raise StreamerIsOfflineException
@@ -179,27 +221,14 @@ class Twitch(object):
                 return response["data"]["user"]
 
     def check_streamer_online(self, streamer):
-        if time.time() < streamer.offline_at + 60:
-            return
-
-        if streamer.is_online is False:
-            try:
-                self.get_spade_url(streamer)
-                self.update_stream(streamer)
-            except StreamerIsOfflineException:
-                streamer.set_offline()
-            else:
-                streamer.set_online()
-        else:
-            try:
-                self.update_stream(streamer)
-            except StreamerIsOfflineException:
-                streamer.set_offline()
+        self.stream_monitor.check(streamer)
 
     def get_channel_id(self, streamer_username):
-        json_data = copy.deepcopy(GQLOperations.GetIDFromLogin)
-        json_data["variables"]["login"] = streamer_username
-        json_response = self.post_gql_request(json_data)
+        channel_id = self.channel_ids.get(streamer_username)
+        if channel_id is not None:
+            return channel_id
+        json_data = GQLOperations.GetIDFromLogin.request({"login": streamer_username})
+        json_response = self.post_gql_request(json_data, batch=True)
         if (
             "data" not in json_response
             or "user" not in json_response["data"]
@@ -207,18 +236,53 @@ class Twitch(object):
         ):
             raise StreamerDoesNotExistException
         else:
-            return json_response["data"]["user"]["id"]
+            channel_id = json_response["data"]["user"]["id"]
+            self.channel_ids.set(streamer_username, channel_id)
+            self.channel_ids.save()
+            return channel_id
+
+    def get_channel_ids(self, streamers_usernames: list) -> dict:
+        # Only the usernames not in the cache are resolved, all at once so that the batcher packs them together
+        missing = self.channel_ids.missing(streamers_usernames)
+        if missing != []:
+            logger.info(
+                f"Resolving the channel id of {len(missing)} streamers ({len(streamers_usernames) - len(missing)} cached)"
+            )
+
+            async def resolve():
+                return await asyncio.gather(
+                    *[
+                        self.post_gql_request_async(
+                            GQLOperations.GetIDFromLogin.request({"login": username}),
+                            batch=True,
+                        )
+                        for username in missing
+                    ]
+                )
+
+            for username, json_response in zip(missing, self.async_client.run(resolve())):
+                user = json_response.get("data", {}).get("user")
+                if user is not None:
+                    self.channel_ids.set(username, user["id"])
+            self.channel_ids.save()
+
+        channel_ids = {}
+        for username in streamers_usernames:
+            channel_id = self.channel_ids.get(username)
+            if channel_id is not None:
+                channel_ids[username] = channel_id
+        return channel_ids
 
     def get_followers(
         self, limit: int = 100, order: FollowersOrder = FollowersOrder.ASC
     ):
-        json_data = copy.deepcopy(GQLOperations.ChannelFollows)
-        json_data["variables"] = {"limit": limit, "order": str(order)}
         has_next = True
         last_cursor = ""
         follows = []
         while has_next is True:
-            json_data["variables"]["cursor"] = last_cursor
+            json_data = GQLOperations.ChannelFollows.request(
+                {"limit": limit, "order": str(order), "cursor": last_cursor}
+            )
             json_response = self.post_gql_request(json_data)
             try:
                 follows_response = json_response["data"]["user"]["follows"]
@@ -235,8 +299,9 @@ class Twitch(object):
     def update_raid(self, streamer, raid):
         if streamer.raid != raid:
             streamer.raid = raid
-            json_data = copy.deepcopy(GQLOperations.JoinRaid)
-            json_data["variables"] = {"input": {"raidID": raid.raid_id}}
+            json_data = GQLOperations.JoinRaid.request(
+                {"input": {"raidID": raid.raid_id}}
+            )
             self.post_gql_request(json_data)
 
             logger.info(
@@ -246,8 +311,9 @@ class Twitch(object):
             )
 
     def viewer_is_mod(self, streamer):
-        json_data = copy.deepcopy(GQLOperations.ModViewChannelQuery)
-        json_data["variables"] = {"channelLogin": streamer.username}
+        json_data = GQLOperations.ModViewChannelQuery.request(
+            {"channelLogin": streamer.username}
+        )
         response = self.post_gql_request(json_data)
         try:
             streamer.viewer_is_mod = response["data"]["user"]["self"]["isModerator"]
@@ -273,31 +339,107 @@ class Twitch(object):
             )
             self.__chuncked_sleep(random_sleep * 60, chunk_size=chunk_size)
 
-    def post_gql_request(self, json_data):
+    def post_gql_request(self, json_data, batch=False, deadline=None):
+        # Thin synchronous wrapper, the request runs on the shared event loop
+        return self.async_client.run(
+            self.post_gql_request_async(json_data, batch=batch, deadline=deadline)
+        )
+
+    async def post_gql_request_async(self, json_data, batch=False, deadline=None):
+        # Idempotent queries requested a few seconds ago by someone else are served from the cache
+        response = self.gql_cache.get(json_data)
+        if response is not None:
+            return response
+        if isinstance(json_data, list) or json_data.operation_name in GQL_MUTATIONS:
+            return await self.__fetch_gql(json_data, batch, deadline)
+
+        # Identical queries already in flight (e.g. the stream info asked by the WebSocket and the watcher) share the same call
+        key = json_data.encode()
+        in_flight = self.__in_flight.get(key)
+        if in_flight is not None:
+            self.gql_deduplicated += 1
+            return await asyncio.shield(in_flight)
+        in_flight = asyncio.get_running_loop().create_future()
+        self.__in_flight[key] = in_flight
         try:
-            response = requests.post(
-                GQLOperations.url,
-                json=json_data,
-                headers={
-                    "Authorization": f"OAuth {self.twitch_login.get_auth_token()}",
-                    "Client-Id": CLIENT_ID,
-                    # "Client-Integrity": self.post_integrity(),
-                    "Client-Session-Id": self.client_session,
-                    "Client-Version": self.update_client_version(),
-                    "User-Agent": self.user_agent,
-                    "X-Device-Id": self.device_id,
-                },
-            timeout=60)
-            logger.debug(
-                f"Data: {json_data}, Status code: {response.status_code}, Content: {response.text}"
-            )
-            return response.json()
-        except requests.exceptions.RequestException as e:
+            response = await self.__fetch_gql(json_data, batch, deadline)
+            in_flight.set_result(response)
+            return response
+        finally:
+            del self.__in_flight[key]
+            if in_flight.done() is False:
+                in_flight.set_result({})
+
+    async def __fetch_gql(self, json_data, batch=False, deadline=None):
+        if batch is True:
+            # Operations sent with batch=True share a single POST with the others submitted in the same window
+            response = await self.gql_batcher.submit(json_data, deadline)
+        else:
+            response = await self.__send_gql(json_data, deadline)
+        self.gql_cache.set(json_data, response)
+        return response
+
+    async def __send_gql(self, json_data, deadline=None):
+        try:
+            # Wait for our turn, the priority depends on the operation (bets first, background syncs last)
+            if await self.gql_scheduler.acquire(
+                GQLScheduler.priority_of(json_data), deadline
+            ) is False:
+                logger.warning(
+                    f"GQLOperations ({self.__operation_name(json_data)}) missed its deadline, request dropped"
+                )
+                return {}
+            client_version = self.client_version.get()
+            response = await self.__post_gql(json_data, client_version)
+            if ClientVersion.is_mismatch(response):
+                # Our build is outdated, force a refresh and retry only once
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self.client_version.refresh, True
+                )
+                if self.client_version.version != client_version:
+                    await self.gql_scheduler.acquire(
+                        GQLScheduler.priority_of(json_data)
+                    )
+                    response = await self.__post_gql(
+                        json_data, self.client_version.version
+                    )
+            return response
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
             logger.error(
-                f"Error with GQLOperations ({json_data['operationName']}): {e}"
+                f"Error with GQLOperations ({self.__operation_name(json_data)}): {e}"
             )
             return {}
 
+    @staticmethod
+    def __operation_name(json_data):
+        if isinstance(json_data, list):
+            return ", ".join(sorted(set(item.operation_name for item in json_data)))
+        return json_data.operation_name
+
+    async def __post_gql(self, json_data, client_version):
+        status_code, text = await self.async_client.post(
+            GQLOperations.url,
+            data=(
+                GQLRequest.encode_batch(json_data)
+                if isinstance(json_data, list)
+                else json_data.encode()
+            ),
+            headers={
+                "Authorization": f"OAuth {self.twitch_login.get_auth_token()}",
+                "Client-Id": CLIENT_ID,
+                # "Client-Integrity": self.post_integrity(),
+                "Client-Session-Id": self.client_session,
+                "Client-Version": client_version,
+                "Content-Type": "application/json",
+                "User-Agent": self.user_agent,
+                "X-Device-Id": self.device_id,
+            },
+        )
+        logger.debug(
+            f"Data: {json_data}, Status code: {status_code}, Content: {text}"
+        )
+        return json.loads(text)
+
     # Request for Integrity Token
     # Twitch needs Authorization, Client-Id, X-Device-Id to generate JWT which is used for authorize gql requests
     # Regenerate Integrity Token 5 minutes before expire
@@ -355,330 +497,352 @@ class Twitch(object):
             return False"""
 
     def update_client_version(self):
-        try:
-            response = requests.get(URL, timeout=60)
-            if response.status_code != 200:
-                logger.debug(
-                    f"Error with update_client_version: {response.status_code}"
-                )
-                return self.client_version
-            matcher = re.search(self.twilight_build_id_pattern, response.text)
-            if not matcher:
-                logger.debug("Error with update_client_version: no match")
-                return self.client_version
-            self.client_version = matcher.group(1)
-            logger.debug(f"Client version: {self.client_version}")
-            return self.client_version
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error with update_client_version: {e}")
-            return self.client_version
+        self.client_version.refresh(force=True)
+        return self.client_version.version
 
     def send_minute_watched_events(self, streamers, priority, chunk_size=3):
+        self.watch_selector.track(streamers)
+        next_tick = time.time()
         while self.running:
             try:
-                streamers_index = [
-                    i
-                    for i in range(0, len(streamers))
-                    if streamers[i].is_online is True
-                    and (
-                        streamers[i].online_at == 0
-                        or (time.time() - streamers[i].online_at) > 30
-                    )
-                ]
-
-                for index in streamers_index:
-                    if (streamers[index].stream.update_elapsed() / 60) > 10:
-                        # Why this user It's currently online but the last updated was more than 10minutes ago?
-                        # Please perform a manually update and check if the user it's online
-                        self.check_streamer_online(streamers[index])
+                # Fallback for the PubSub events never received (stale stream info, stream-up not confirmed yet)
+                self.stream_monitor.poll(
+                    [
+                        streamer
+                        for streamer in map(streamers.get, self.watch_selector.online())
+                        if streamer is not None
+                    ]
+                )
 
                 """
                 Twitch has a limit - you can't watch more than 2 channels at one time.
                 We'll take the first two streamers from the final list as they have the highest priority.
                 """
-                max_watch_amount = 2
-                streamers_watching = set()
+                streamers_watching = [
+                    streamers.get(handle)
+                    for handle in self.watch_selector.select(
+                        priority, max_watch_amount=2
+                    )
+                ]
+                # A streamer may have been removed since the selection
+                streamers_watching = [
+                    streamer for streamer in streamers_watching if streamer is not None
+                ]
 
-                def remaining_watch_amount():
-                    return max_watch_amount - len(streamers_watching)
+                # Both channels are served at the same time, a slow response for one doesn't delay the other
+                if streamers_watching != []:
+                    results = self.async_client.run(
+                        self.__send_minute_watched_all(streamers_watching)
+                    )
+                    for streamer, result in zip(streamers_watching, results):
+                        self.__handle_minute_watched(streamer, result, chunk_size)
+            except Exception:
+                logger.error(
+                    "Exception raised in send minute watched", exc_info=True)
 
-                for prior in priority:
-                    if remaining_watch_amount() <= 0:
-                        break
+            # Fixed cadence: the next tick is scheduled from the previous one, not from the end of the requests
+            next_tick += self.watch_jitter.interval
+            if next_tick < time.time():
+                # Late by more than an interval (suspend, connection lost), don't try to catch up
+                next_tick = time.time()
+            self.__chuncked_sleep(next_tick - time.time(), chunk_size=chunk_size)
+
+    async def __send_minute_watched_all(self, streamers):
+        # Returns the status code (or the exception raised) for each streamer, like send_minute_watched_async
+        results = await asyncio.gather(
+            *[self.__watch_stream(streamer) for streamer in streamers],
+            return_exceptions=True,
+        )
+        watched = [
+            index for index, result in enumerate(results) if result is True
+        ]
+        for index, result in enumerate(results):
+            if result is False:
+                results[index] = None
+        if watched == []:
+            return results
+
+        # The events of all the watched channels are merged in a single request
+        if len(watched) > 1:
+            events = []
+            for index in watched:
+                events.extend(streamers[index].stream.payload or [])
+            try:
+                status_code = await self.__send_spade_events(
+                    [streamers[index] for index in watched],
+                    Stream.encode_events(events),
+                )
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                status_code = e
+            if status_code in [204, None] or isinstance(status_code, BaseException):
+                for index in watched:
+                    results[index] = status_code
+                return results
+
+        # A single channel, or the merged request has been rejected: one request per channel
+        statuses = await asyncio.gather(
+            *[
+                self.__send_spade_events(
+                    [streamers[index]], streamers[index].stream.encode_payload()
+                )
+                for index in watched
+            ],
+            return_exceptions=True,
+        )
+        for index, status_code in zip(watched, statuses):
+            results[index] = status_code
+        return results
 
-                    if prior == Priority.ORDER:
-                        # Get the first 2 items, they are already in order
-                        streamers_watching.update(streamers_index[:remaining_watch_amount()])
+    def __handle_minute_watched(self, streamer, status_code, chunk_size=3):
+        # status_code is the result of send_minute_watched_async, or the exception raised by it
+        if isinstance(status_code, aiohttp.ClientConnectionError):
+            logger.error(
+                f"Error while trying to send minute watched: {status_code}")
+            self.__check_connection_handler(chunk_size)
+            return
+        if isinstance(status_code, asyncio.TimeoutError):
+            logger.error(
+                f"Error while trying to send minute watched: {status_code}")
+            return
+        if isinstance(status_code, BaseException):
+            logger.error(
+                f"Exception raised in send minute watched for {streamer}",
+                exc_info=status_code,
+            )
+            return
+        if status_code is None:
+            return
+        if status_code != 204:
+            # The spade endpoint may have moved, download it again (at most once per minute)
+            self.spade_url.refresh(force=True)
+            return
 
-                    elif prior in [Priority.POINTS_ASCENDING, Priority.POINTS_DESCENDING]:
-                        items = [
-                            {
-                                "points": streamers[index].channel_points,
-                                "index": index
-                            }
-                            for index in streamers_index
-                        ]
-                        items = sorted(
-                            items,
-                            key=lambda x: x["points"],
-                            reverse=(
-                                True if prior == Priority.POINTS_DESCENDING else False
-                            ),
+        streamer.stream.update_minute_watched()
+        self.watch_jitter.record(streamer.username, time.time())
+        if self.first_watch_at is None:
+            self.first_watch_at = time.time()
+            logger.debug(f"First minute watched sent for {streamer}")
+
+        """
+        Remember, you can only earn progress towards a time-based Drop on one participating channel at a time.  [ ! ! ! ]
+        You can also check your progress towards Drops within a campaign anytime by viewing the Drops Inventory.
+        For time-based Drops, if you are unable to claim the Drop in time, you will be able to claim it from the inventory page until the Drops campaign ends.
+        """
+
+        for campaign in streamer.stream.campaigns:
+            for drop in campaign.drops:
+                # We could add .has_preconditions_met condition inside is_printable
+                if (
+                    drop.has_preconditions_met is not False
+                    and drop.is_printable is True
+                ):
+                    drop_messages = [
+                        f"{streamer} is streaming {streamer.stream}",
+                        f"Campaign: {campaign}",
+                        f"Drop: {drop}",
+                        f"{drop.progress_bar()}",
+                    ]
+                    for single_line in drop_messages:
+                        logger.info(
+                            single_line,
+                            extra={
+                                "event": Events.DROP_STATUS,
+                                "skip_telegram": True,
+                                "skip_discord": True,
+                                "skip_webhook": True,
+                                "skip_matrix": True,
+                                "skip_gotify": True
+                            },
                         )
-                        streamers_watching.update([item["index"] for item in items][:remaining_watch_amount()])
-
-                    elif prior == Priority.STREAK:
-                        """
-                        Check if we need need to change priority based on watch streak
-                        Viewers receive points for returning for x consecutive streams.
-                        Each stream must be at least 10 minutes long and it must have been at least 30 minutes since the last stream ended.
-                        Watch at least 6m for get the +10
-                        """
-                        for index in streamers_index:
-                            if (
-                                streamers[index].settings.watch_streak is True
-                                and streamers[index].stream.watch_streak_missing is True
-                                and (
-                                    streamers[index].offline_at == 0
-                                    or (
-                                        (time.time() -
-                                         streamers[index].offline_at)
-                                        // 60
-                                    )
-                                    > 30
-                                )
-                                # fix #425
-                                and streamers[index].stream.minute_watched < 7
-                            ):
-                                streamers_watching.add(index)
-                                if remaining_watch_amount() <= 0:
-                                    break
-
-                    elif prior == Priority.DROPS:
-                        for index in streamers_index:
-                            if streamers[index].drops_condition() is True:
-                                streamers_watching.add(index)
-                                if remaining_watch_amount() <= 0:
-                                    break
-
-                    elif prior == Priority.SUBSCRIBED:
-                        streamers_with_multiplier = [
-                            index
-                            for index in streamers_index
-                            if streamers[index].viewer_has_points_multiplier()
-                        ]
-                        streamers_with_multiplier = sorted(
-                            streamers_with_multiplier,
-                            key=lambda x: streamers[x].total_points_multiplier(
-                            ),
-                            reverse=True,
+
+                    if Settings.logger.telegram is not None:
+                        Settings.logger.telegram.send(
+                            "\n".join(drop_messages),
+                            Events.DROP_STATUS,
                         )
-                        streamers_watching.update(streamers_with_multiplier[:remaining_watch_amount()])
-
-                streamers_watching = list(streamers_watching)[:max_watch_amount]
-
-                for index in streamers_watching:
-                    # next_iteration = time.time() + 60 / len(streamers_watching)
-                    next_iteration = time.time() + 20 / len(streamers_watching)
-
-                    try:
-                        ####################################
-                        # Start of fix for 2024/5 API Change
-                        # Create the JSON data for the GraphQL request
-                        json_data = copy.deepcopy(
-                            GQLOperations.PlaybackAccessToken)
-                        json_data["variables"] = {
-                            "login": streamers[index].username,
-                            "isLive": True,
-                            "isVod": False,
-                            "vodID": "",
-                            "playerType": "site"
-                            # "playerType": "picture-by-picture",
-                        }
 
-                        # Get signature and value using the post_gql_request method
-                        try:
-                            responsePlaybackAccessToken = self.post_gql_request(
-                                json_data)
-                            logger.debug(
-                                f"Sent PlaybackAccessToken request for {streamers[index]}")
-
-                            if 'data' not in responsePlaybackAccessToken:
-                                logger.error(
-                                    f"Invalid response from Twitch: {responsePlaybackAccessToken}")
-                                continue
-
-                            streamPlaybackAccessToken = responsePlaybackAccessToken["data"].get(
-                                'streamPlaybackAccessToken', {})
-                            signature = streamPlaybackAccessToken.get(
-                                "signature")
-                            value = streamPlaybackAccessToken.get("value")
-
-                            if not signature or not value:
-                                logger.error(
-                                    f"Missing signature or value in Twitch response: {responsePlaybackAccessToken}")
-                                continue
-
-                        except Exception as e:
-                            logger.error(
-                                f"Error fetching PlaybackAccessToken for {streamers[index]}: {str(e)}")
-                            continue
+                    if Settings.logger.discord is not None:
+                        Settings.logger.discord.send(
+                            "\n".join(drop_messages),
+                            Events.DROP_STATUS,
+                        )
+                    if Settings.logger.webhook is not None:
+                        Settings.logger.webhook.send(
+                            "\n".join(drop_messages),
+                            Events.DROP_STATUS,
+                        )
+                    if Settings.logger.gotify is not None:
+                        Settings.logger.gotify.send(
+                            "\n".join(drop_messages),
+                            Events.DROP_STATUS,
+                        )
 
-                        # encoded_value = quote(json.dumps(value))
+    async def send_minute_watched_async(self, streamer):
+        # Returns the status code of the minute-watched request, None if we didn't reach the spade endpoint
+        if await self.__watch_stream(streamer) is False:
+            return None
+        return await self.__send_spade_events(
+            [streamer], streamer.stream.encode_payload()
+        )
 
-                        # Construct the URL for the broadcast qualities
-                        RequestBroadcastQualitiesURL = f"https://usher.ttvnw.net/api/channel/hls/{streamers[index].username}.m3u8?sig={signature}&token={value}"
+    async def __watch_stream(self, streamer) -> bool:
+        # Download the playlist and the newest segment as a player would do, False on failure
+        ####################################
+        # Start of fix for 2024/5 API Change
+        # The token and the variant playlist don't change during a broadcast, only the first tick asks for them
+        broadcast_id = streamer.stream.broadcast_id
+        playback = self.hls_cache.get(broadcast_id)
+        if playback is None:
+            playback = await self.__get_playback(streamer)
+            if playback is None:
+                return False
+            self.hls_cache.set(broadcast_id, **playback)
+        BroadcastLowestQualityURL = playback["variant_url"]
 
-                        # Get list of video qualities
-                        responseBroadcastQualities = requests.get(
-                            RequestBroadcastQualitiesURL,
-                            headers={"User-Agent": self.user_agent},
-                            timeout=20,
-                        )  # timeout=60
-                        logger.debug(
-                            f"Send RequestBroadcastQualitiesURL request for {streamers[index]} - Status code: {responseBroadcastQualities.status_code}"
-                        )
-                        if responseBroadcastQualities.status_code != 200:
-                            continue
-                        BroadcastQualities = responseBroadcastQualities.text
+        # Get list of video URLs
+        status_code, StreamURLList = await self.async_client.get(
+            BroadcastLowestQualityURL,
+            headers={"User-Agent": self.user_agent},
+        )
+        logger.debug(
+            f"Send BroadcastLowestQualityURL request for {streamer} - Status code: {status_code}"
+        )
+        if status_code != 200:
+            # Token revoked or playlist gone, the next tick will start from the beginning
+            self.hls_cache.invalidate(broadcast_id)
+            self.m3u8.forget(BroadcastLowestQualityURL)
+            return False
 
-                        # Just takes the last line, which should be the URL for the lowest quality
-                        BroadcastLowestQualityURL = BroadcastQualities.split(
-                            "\n")[-1]
-                        if not validators.url(BroadcastLowestQualityURL):
-                            continue
+        # The newest segment, as a player would do
+        StreamLowestQualityURL = self.m3u8.newest_segment(
+            StreamURLList, BroadcastLowestQualityURL
+        )
+        if StreamLowestQualityURL is None:
+            return False
 
-                        # Get list of video URLs
-                        responseStreamURLList = requests.get(
-                            BroadcastLowestQualityURL,
-                            headers={"User-Agent": self.user_agent},
-                            timeout=20,
-                        )  # timeout=60
-                        logger.debug(
-                            f"Send BroadcastLowestQualityURL request for {streamers[index]} - Status code: {responseStreamURLList.status_code}"
-                        )
-                        if responseStreamURLList.status_code != 200:
-                            continue
-                        StreamURLList = responseStreamURLList.text
+        # Perform a HEAD request to simulate watching the stream
+        status_code, _ = await self.async_client.head(
+            StreamLowestQualityURL,
+            headers={"User-Agent": self.user_agent},
+        )
+        logger.debug(
+            f"Send StreamLowestQualityURL request for {streamer} - Status code: {status_code}"
+        )
+        # End of fix for 2024/5 API Change
+        ##################################
+        return status_code == 200
+
+    async def __send_spade_events(self, streamers, data):
+        # Returns None without sending anything while the spade url is unknown (SpadeURL retries by itself)
+        url = self.spade_url.url or next(
+            (
+                streamer.stream.spade_url
+                for streamer in streamers
+                if streamer.stream.spade_url is not None
+            ),
+            None,
+        )
+        if url is None:
+            logger.debug(
+                f"No spade url yet, minute watched not sent for {', '.join(str(streamer) for streamer in streamers)}"
+            )
+            return None
+        status_code, _ = await self.async_client.post(
+            url,
+            data=data,
+            headers={"User-Agent": self.user_agent},
+        )
+        logger.debug(
+            f"Send minute watched request for {', '.join(str(streamer) for streamer in streamers)} - Status code: {status_code}"
+        )
+        return status_code
+
+    async def __get_playback(self, streamer):
+        # Returns the access token and the URL of the lowest quality variant playlist, None on failure
+        # Create the JSON data for the GraphQL request
+        json_data = GQLOperations.PlaybackAccessToken.request(
+            {
+                "login": streamer.username,
+                "isLive": True,
+                "isVod": False,
+                "vodID": "",
+                "playerType": "site"
+                # "playerType": "picture-by-picture",
+            }
+        )
 
-                        # Just takes the last line, which should be the URL for the lowest quality
-                        StreamLowestQualityURL = StreamURLList.split("\n")[-2]
-                        if not validators.url(StreamLowestQualityURL):
-                            continue
+        # Get signature and value using the post_gql_request method
+        try:
+            responsePlaybackAccessToken = await self.post_gql_request_async(json_data)
+            logger.debug(f"Sent PlaybackAccessToken request for {streamer}")
 
-                        # Perform a HEAD request to simulate watching the stream
-                        responseStreamLowestQualityURL = requests.head(
-                            StreamLowestQualityURL,
-                            headers={"User-Agent": self.user_agent},
-                            timeout=20,
-                        )  # timeout=60
-                        logger.debug(
-                            f"Send StreamLowestQualityURL request for {streamers[index]} - Status code: {responseStreamLowestQualityURL.status_code}"
-                        )
-                        if responseStreamLowestQualityURL.status_code != 200:
-                            continue
-                        # End of fix for 2024/5 API Change
-                        ##################################
-                        response = requests.post(
-                            streamers[index].stream.spade_url,
-                            data=streamers[index].stream.encode_payload(),
-                            headers={"User-Agent": self.user_agent},
-                            # timeout=60,
-                            timeout=20,
-                        )
-                        logger.debug(
-                            f"Send minute watched request for {streamers[index]} - Status code: {response.status_code}"
-                        )
-                        if response.status_code == 204:
-                            streamers[index].stream.update_minute_watched()
-
-                            """
-                            Remember, you can only earn progress towards a time-based Drop on one participating channel at a time.  [ ! ! ! ]
-                            You can also check your progress towards Drops within a campaign anytime by viewing the Drops Inventory.
-                            For time-based Drops, if you are unable to claim the Drop in time, you will be able to claim it from the inventory page until the Drops campaign ends.
-                            """
-
-                            for campaign in streamers[index].stream.campaigns:
-                                for drop in campaign.drops:
-                                    # We could add .has_preconditions_met condition inside is_printable
-                                    if (
-                                        drop.has_preconditions_met is not False
-                                        and drop.is_printable is True
-                                    ):
-                                        drop_messages = [
-                                            f"{streamers[index]} is streaming {streamers[index].stream}",
-                                            f"Campaign: {campaign}",
-                                            f"Drop: {drop}",
-                                            f"{drop.progress_bar()}",
-                                        ]
-                                        for single_line in drop_messages:
-                                            logger.info(
-                                                single_line,
-                                                extra={
-                                                    "event": Events.DROP_STATUS,
-                                                    "skip_telegram": True,
-                                                    "skip_discord": True,
-                                                    "skip_webhook": True,
-                                                    "skip_matrix": True,
-                                                    "skip_gotify": True
-                                                },
-                                            )
-
-                                        if Settings.logger.telegram is not None:
-                                            Settings.logger.telegram.send(
-                                                "\n".join(drop_messages),
-                                                Events.DROP_STATUS,
-                                            )
-
-                                        if Settings.logger.discord is not None:
-                                            Settings.logger.discord.send(
-                                                "\n".join(drop_messages),
-                                                Events.DROP_STATUS,
-                                            )
-                                        if Settings.logger.webhook is not None:
-                                            Settings.logger.webhook.send(
-                                                "\n".join(drop_messages),
-                                                Events.DROP_STATUS,
-                                            )
-                                        if Settings.logger.gotify is not None:
-                                            Settings.logger.gotify.send(
-                                                "\n".join(drop_messages),
-                                                Events.DROP_STATUS,
-                                            )
-
-                    except requests.exceptions.ConnectionError as e:
-                        logger.error(
-                            f"Error while trying to send minute watched: {e}")
-                        self.__check_connection_handler(chunk_size)
-                    except requests.exceptions.Timeout as e:
-                        logger.error(
-                            f"Error while trying to send minute watched: {e}")
+            if 'data' not in responsePlaybackAccessToken:
+                logger.error(
+                    f"Invalid response from Twitch: {responsePlaybackAccessToken}")
+                return None
 
-                    self.__chuncked_sleep(
-                        next_iteration - time.time(), chunk_size=chunk_size
-                    )
+            streamPlaybackAccessToken = responsePlaybackAccessToken["data"].get(
+                'streamPlaybackAccessToken', {})
+            signature = streamPlaybackAccessToken.get("signature")
+            value = streamPlaybackAccessToken.get("value")
 
-                if streamers_watching == []:
-                    # self.__chuncked_sleep(60, chunk_size=chunk_size)
-                    self.__chuncked_sleep(20, chunk_size=chunk_size)
-            except Exception:
+            if not signature or not value:
                 logger.error(
-                    "Exception raised in send minute watched", exc_info=True)
+                    f"Missing signature or value in Twitch response: {responsePlaybackAccessToken}")
+                return None
+
+        except Exception as e:
+            logger.error(
+                f"Error fetching PlaybackAccessToken for {streamer}: {str(e)}")
+            return None
+
+        # encoded_value = quote(json.dumps(value))
+
+        # Construct the URL for the broadcast qualities
+        RequestBroadcastQualitiesURL = f"https://usher.ttvnw.net/api/channel/hls/{streamer.username}.m3u8?sig={signature}&token={value}"
+
+        # Get list of video qualities
+        status_code, BroadcastQualities = await self.async_client.get(
+            RequestBroadcastQualitiesURL,
+            headers={"User-Agent": self.user_agent},
+        )
+        logger.debug(
+            f"Send RequestBroadcastQualitiesURL request for {streamer} - Status code: {status_code}"
+        )
+        if status_code != 200:
+            return None
+
+        # The variant with the lowest bandwidth, whatever the order of the playlist
+        BroadcastLowestQualityURL = M3U8.lowest_variant(
+            BroadcastQualities, RequestBroadcastQualitiesURL
+        )
+        if BroadcastLowestQualityURL is None:
+            return None
+        return {
+            "signature": signature,
+            "token": value,
+            "variant_url": BroadcastLowestQualityURL,
+        }
 
     # === CHANNEL POINTS / PREDICTION === #
     # Load the amount of current points for a channel, check if a bonus is available
     def load_channel_points_context(self, streamer):
-        json_data = copy.deepcopy(GQLOperations.ChannelPointsContext)
-        json_data["variables"] = {"channelLogin": streamer.username}
+        json_data = GQLOperations.ChannelPointsContext.request(
+            {"channelLogin": streamer.username}
+        )
 
-        response = self.post_gql_request(json_data)
+        response = self.post_gql_request(json_data, batch=True)
         if response != {}:
             if response["data"]["community"] is None:
+                # The channel has been deleted or renamed, its id must be resolved again next time
+                self.channel_ids.invalidate(streamer.username)
+                self.channel_ids.save()
                 raise StreamerDoesNotExistException
             channel = response["data"]["community"]["channel"]
             community_points = channel["self"]["communityPoints"]
             streamer.channel_points = community_points["balance"]
             streamer.activeMultipliers = community_points["activeMultipliers"]
+            self.watch_selector.update(streamer)
 
             if streamer.settings.community_goals is True:
                 streamer.community_goals = {
@@ -735,16 +899,24 @@ class Twitch(object):
                         },
                     )
 
-                    json_data = copy.deepcopy(GQLOperations.MakePrediction)
-                    json_data["variables"] = {
-                        "input": {
-                            "eventID": event.event_id,
-                            "outcomeID": decision["id"],
-                            "points": decision["amount"],
-                            "transactionID": token_hex(16),
+                    json_data = GQLOperations.MakePrediction.request(
+                        {
+                            "input": {
+                                "eventID": event.event_id,
+                                "outcomeID": decision["id"],
+                                "points": decision["amount"],
+                                "transactionID": token_hex(16),
+                            }
                         }
-                    }
-                    response = self.post_gql_request(json_data)
+                    )
+                    # The bet was scheduled just a few seconds before the prediction window closes
+                    response = self.post_gql_request(
+                        json_data, deadline=time.time() + 5
+                    )
+                    self.gql_cache.invalidate(
+                        GQLOperations.ChannelPointsContext,
+                        {"channelLogin": event.streamer.username},
+                    )
                     if (
                         "data" in response
                         and "makePrediction" in response["data"]
@@ -783,11 +955,14 @@ class Twitch(object):
                 extra={"emoji": ":gift:", "event": Events.BONUS_CLAIM},
             )
 
-        json_data = copy.deepcopy(GQLOperations.ClaimCommunityPoints)
-        json_data["variables"] = {
-            "input": {"channelID": streamer.channel_id, "claimID": claim_id}
-        }
-        self.post_gql_request(json_data)
+        json_data = GQLOperations.ClaimCommunityPoints.request(
+            {"input": {"channelID": streamer.channel_id, "claimID": claim_id}}
+        )
+        self.post_gql_request(json_data, batch=True)
+        # The balance and the available claim have changed
+        self.gql_cache.invalidate(
+            GQLOperations.ChannelPointsContext, {"channelLogin": streamer.username}
+        )
 
     # === MOMENTS === #
     def claim_moment(self, streamer, moment_id):
@@ -798,15 +973,19 @@ class Twitch(object):
                        "event": Events.MOMENT_CLAIM},
             )
 
-        json_data = copy.deepcopy(GQLOperations.CommunityMomentCallout_Claim)
-        json_data["variables"] = {"input": {"momentID": moment_id}}
-        self.post_gql_request(json_data)
+        json_data = GQLOperations.CommunityMomentCallout_Claim.request(
+            {"input": {"momentID": moment_id}}
+        )
+        self.post_gql_request(json_data, batch=True)
+        self.gql_cache.invalidate(
+            GQLOperations.ChannelPointsContext, {"channelLogin": streamer.username}
+        )
 
     # === CAMPAIGNS / DROPS / INVENTORY === #
     def __get_campaign_ids_from_streamer(self, streamer):
-        json_data = copy.deepcopy(
-            GQLOperations.DropsHighlightService_AvailableDrops)
-        json_data["variables"] = {"channelID": streamer.channel_id}
+        json_data = GQLOperations.DropsHighlightService_AvailableDrops.request(
+            {"channelID": streamer.channel_id}
+        )
         response = self.post_gql_request(json_data)
         try:
             return (
@@ -821,7 +1000,7 @@ class Twitch(object):
             return []
 
     def __get_inventory(self):
-        response = self.post_gql_request(GQLOperations.Inventory)
+        response = self.post_gql_request(GQLOperations.Inventory.request())
         try:
             return (
                 response["data"]["currentUser"]["inventory"] if response != {} else {}
@@ -830,7 +1009,9 @@ class Twitch(object):
             return {}
 
     def __get_drops_dashboard(self, status=None):
-        response = self.post_gql_request(GQLOperations.ViewerDropsDashboard)
+        response = self.post_gql_request(
+            GQLOperations.ViewerDropsDashboard.request()
+        )
         campaigns = (
             response.get("data", {})
             .get("currentUser", {})
@@ -847,27 +1028,33 @@ class Twitch(object):
 
     def __get_campaigns_details(self, campaigns):
         result = []
-        chunks = create_chunks(campaigns, 20)
-        for chunk in chunks:
-            json_data = []
-            for campaign in chunk:
-                json_data.append(copy.deepcopy(
-                    GQLOperations.DropCampaignDetails))
-                json_data[-1]["variables"] = {
-                    "dropID": campaign["id"],
-                    "channelLogin": f"{self.twitch_login.get_user_id()}",
-                }
 
-            response = self.post_gql_request(json_data)
-            if not isinstance(response, list):
-                logger.debug("Unexpected campaigns response format, skipping chunk")
+        async def details():
+            # The batcher will group them in POST of max 20 operations
+            return await asyncio.gather(
+                *[
+                    self.post_gql_request_async(
+                        GQLOperations.DropCampaignDetails.request(
+                            {
+                                "dropID": campaign["id"],
+                                "channelLogin": f"{self.twitch_login.get_user_id()}",
+                            }
+                        ),
+                        batch=True,
+                    )
+                    for campaign in campaigns
+                ]
+            )
+
+        for response in self.async_client.run(details()):
+            if not isinstance(response, dict):
+                logger.debug("Unexpected campaigns response format, skipping campaign")
                 continue
-            for r in response:
-                drop_campaign = (
-                    r.get("data", {}).get("user", {}).get("dropCampaign", None)
-                )
-                if drop_campaign is not None:
-                    result.append(drop_campaign)
+            drop_campaign = (
+                response.get("data", {}).get("user", {}).get("dropCampaign", None)
+            )
+            if drop_campaign is not None:
+                result.append(drop_campaign)
         return result
 
     def __sync_campaigns(self, campaigns):
@@ -899,10 +1086,11 @@ class Twitch(object):
             f"Claim {drop}", extra={"emoji": ":package:", "event": Events.DROP_CLAIM}
         )
 
-        json_data = copy.deepcopy(GQLOperations.DropsPage_ClaimDropRewards)
-        json_data["variables"] = {
-            "input": {"dropInstanceID": drop.drop_instance_id}}
-        response = self.post_gql_request(json_data)
+        json_data = GQLOperations.DropsPage_ClaimDropRewards.request(
+            {"input": {"dropInstanceID": drop.drop_instance_id}}
+        )
+        response = self.post_gql_request(json_data, batch=True)
+        self.gql_cache.invalidate(GQLOperations.ViewerDropsDashboard)
         try:
             # response["data"]["claimDropRewards"] can be null and respose["data"]["errors"] != []
             # or response["data"]["claimDropRewards"]["status"] === DROP_INSTANCE_ALREADY_CLAIMED
@@ -977,16 +1165,15 @@ class Twitch(object):
                 campaigns = self.__sync_campaigns(campaigns)
 
                 # Check if user It's currently streaming the same game present in campaigns_details
-                for i in range(0, len(streamers)):
-                    if streamers[i].drops_condition() is True:
-                        # yes! The streamer[i] have the drops_tags enabled and we It's currently stream a game with campaign active!
+                for streamer in streamers:
+                    if streamer.drops_condition() is True:
+                        # yes! The streamer have the drops_tags enabled and we It's currently stream a game with campaign active!
                         # With 'campaigns_ids' we are also sure that this streamer have the campaign active.
-                        # yes! The streamer[index] have the drops_tags enabled and we It's currently stream a game with campaign active!
-                        streamers[i].stream.campaigns = list(
+                        streamer.stream.campaigns = list(
                             filter(
                                 lambda x: x.drops != []
-                                and x.game == streamers[i].stream.game
-                                and x.id in streamers[i].stream.campaigns_ids,
+                                and x.game == streamer.stream.game
+                                and x.id in streamer.stream.campaigns_ids,
                                 campaigns,
                             )
                         )
@@ -1004,8 +1191,9 @@ class Twitch(object):
             goal.status == "STARTED" and goal.is_in_stock
             for goal in streamer.community_goals.values()
         ):
-            json_data = copy.deepcopy(GQLOperations.UserPointsContribution)
-            json_data["variables"] = {"channelLogin": streamer.username}
+            json_data = GQLOperations.UserPointsContribution.request(
+                {"channelLogin": streamer.username}
+            )
             response = self.post_gql_request(json_data)
             user_goal_contributions = response["data"]["user"]["channel"]["self"][
                 "communityPoints"
@@ -1046,18 +1234,21 @@ class Twitch(object):
                         )
 
     def contribute_to_community_goal(self, streamer, goal_id, title, amount):
-        json_data = copy.deepcopy(
-            GQLOperations.ContributeCommunityPointsCommunityGoal)
-        json_data["variables"] = {
-            "input": {
-                "amount": amount,
-                "channelID": streamer.channel_id,
-                "goalID": goal_id,
-                "transactionID": token_hex(16),
+        json_data = GQLOperations.ContributeCommunityPointsCommunityGoal.request(
+            {
+                "input": {
+                    "amount": amount,
+                    "channelID": streamer.channel_id,
+                    "goalID": goal_id,
+                    "transactionID": token_hex(16),
+                }
             }
-        }
+        )
 
         response = self.post_gql_request(json_data)
+        self.gql_cache.invalidate(
+            GQLOperations.ChannelPointsContext, {"channelLogin": streamer.username}
+        )
 
         error = response["data"]["contributeCommunityPointsCommunityGoal"]["error"]
         if error:
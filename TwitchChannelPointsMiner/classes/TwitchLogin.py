@@ -2,7 +2,6 @@
 # Original Copyright (c) 2020 Rodney
 # The MIT License (MIT)
 
-import copy
 # import getpass
 import logging
 import os
@@ -341,9 +340,12 @@ class TwitchLogin(object):
         return user_id
 
     def __set_user_id(self):
-        json_data = copy.deepcopy(GQLOperations.GetIDFromLogin)
-        json_data["variables"]["login"] = self.username
-        response = self.session.post(GQLOperations.url, json=json_data)
+        json_data = GQLOperations.GetIDFromLogin.request({"login": self.username})
+        response = self.session.post(
+            GQLOperations.url,
+            data=json_data.encode(),
+            headers={"Content-Type": "application/json"},
+        )
 
         if response.status_code == 200:
             json_response = response.json()
@@ -1,18 +1,69 @@
+import asyncio
 import json
 import logging
+import secrets
 import time
 
-from websocket import WebSocketApp, WebSocketConnectionClosedException
+import aiohttp
 
+from TwitchChannelPointsMiner.classes.Settings import Settings
 from TwitchChannelPointsMiner.utils import create_nonce
 
 logger = logging.getLogger(__name__)
 
+# Topics per LISTEN frame. A connection can't listen to more than 50 topics anyway
+LISTEN_MAX_TOPICS = 50
+# The topics submitted within this delay share the same LISTEN frame
+LISTEN_DELAY = 0.05
+# A new connection is ready when all its LISTEN got a RESPONSE, or after this timeout
+LISTEN_TIMEOUT = 10
+# Delay before the n-th attempt to connect: BACKOFF_BASE * 2^(n-1) seconds at most BACKOFF_MAX, with jitter
+BACKOFF_BASE = 1
+BACKOFF_MAX = 120
 
-class TwitchWebSocket(WebSocketApp):
-    def __init__(self, index, parent_pool, *args, **kw):
-        super().__init__(*args, **kw)
+CLOSED_TYPES = [
+    aiohttp.WSMsgType.CLOSE,
+    aiohttp.WSMsgType.CLOSING,
+    aiohttp.WSMsgType.CLOSED,
+    aiohttp.WSMsgType.ERROR,
+]
+
+
+class TwitchWebSocket(object):
+    """
+    A PubSub connection, run by a task of the event loop of the pool (AsyncClient.loop): connect, LISTEN, ping and reconnect.
+    The messages are handed to the pool (WebSocketsPool.dispatch), the handlers never run on the loop.
+    Make-before-break: on RECONNECT the replacement is opened and subscribed while the current connection still receives,
+    then they are swapped. A lost connection is opened again with an exponential backoff, the gaps are recorded by the pool.
+    All the methods are called from the loop, except reconnect() that can be called from any thread.
+    """
+
+    __slots__ = [
+        "index",
+        "url",
+        "parent_pool",
+        "is_closed",
+        "is_opened",
+        "is_reconnecting",
+        "forced_close",
+        "topics",
+        "twitch",
+        "streamers",
+        "events_predictions",
+        "last_pong",
+        "last_ping",
+        "__next_ping",
+        "__unsent",
+        "__flush",
+        "__listens",
+        "__ws",
+        "__task",
+        "__replacement",
+    ]
+
+    def __init__(self, index, parent_pool, url):
         self.index = index
+        self.url = url
 
         self.parent_pool = parent_pool
         self.is_closed = False
@@ -21,42 +72,294 @@ class TwitchWebSocket(WebSocketApp):
         self.is_reconnecting = False
         self.forced_close = False
 
-        # Custom attribute
+        # Listened on open, and again by each new connection
         self.topics = []
-        self.pending_topics = []
 
         self.twitch = parent_pool.twitch
         self.streamers = parent_pool.streamers
         self.events_predictions = parent_pool.events_predictions
 
-        self.last_message_timestamp = None
-        self.last_message_type_channel = None
-
         self.last_pong = time.time()
         self.last_ping = time.time()
+        self.__next_ping = 0
+        # Topics submitted while opened, waiting for the next LISTEN frame
+        self.__unsent = []
+        self.__flush = None
+        # nonce -> topics of the LISTEN/UNLISTEN frames without a RESPONSE yet
+        self.__listens = {}
+
+        self.__ws = None
+        self.__task = None
+        # Task opening the connection that replaces the current one (RECONNECT)
+        self.__replacement = None
+
+    @staticmethod
+    def backoff(failures: int) -> float:
+        # Jitter on the whole delay: the connections dropped at the same time don't come back at the same time
+        if failures <= 0:
+            return secrets.SystemRandom().uniform(0, BACKOFF_BASE)
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (failures - 1))
+        return secrets.SystemRandom().uniform(delay / 2, delay)
+
+    def start(self):
+        self.__task = asyncio.get_running_loop().create_task(self.run())
+
+    async def run(self):
+        lost_at = None
+        while self.forced_close is False:
+            self.__ws = await self.__open_with_backoff()
+            if self.__ws is None:
+                break
+            self.is_opened = True
+            self.is_closed = False
+            if lost_at is not None:
+                self.parent_pool.record_gap(self, time.time() - lost_at)
+
+            try:
+                lost_at = await self.__receive()
+            except Exception:
+                # Whatever happened, the topics of this connection must not stay without a socket
+                logger.error(
+                    f"#{self.index} - Unexpected error on the WebSocket", exc_info=True
+                )
+                lost_at = time.time()
+
+            self.is_opened = False
+            self.is_closed = True
+            if self.__ws is not None:
+                await self.__ws.close()
+                self.__ws = None
+            if self.forced_close is False:
+                logger.info(f"#{self.index} - WebSocket closed, reconnecting")
+
+    async def __open_with_backoff(self):
+        # None only if the pool has been closed in the meantime
+        failures = 0
+        while self.forced_close is False:
+            await asyncio.sleep(self.backoff(failures))
+            try:
+                return await self.__open()
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                # Connection lost | [WinError 10054] An existing connection was forcibly closed by the remote host
+                failures += 1
+                logger.error(
+                    f"#{self.index} - WebSocket error: {e}, attempt #{failures} failed"
+                )
+            except Exception:
+                failures += 1
+                logger.error(
+                    f"#{self.index} - Unexpected error while opening the WebSocket, attempt #{failures} failed",
+                    exc_info=True,
+                )
+        return None
+
+    async def __open(self):
+        # A new connection, returned once it listens to all the topics
+        ws = await self.parent_pool.session().ws_connect(
+            self.url,
+            ssl=False if Settings.disable_ssl_cert_verification is True else True,
+        )
+        try:
+            self.last_pong = time.time()
+            await self.ping(ws)
+            topics = list(self.topics)
+            nonces = await self.listen(
+                topics, self.twitch.twitch_login.get_auth_token(), ws=ws
+            )
 
-    # def close(self):
-    #     self.forced_close = True
-    #     super().close()
+            deadline = time.time() + LISTEN_TIMEOUT
+            while any(nonce in self.__listens for nonce in nonces):
+                if time.time() >= deadline:
+                    logger.warning(
+                        f"#{self.index} - No RESPONSE to LISTEN after {LISTEN_TIMEOUT}s"
+                    )
+                    break
+                message = await ws.receive(timeout=deadline - time.time())
+                if message.type == aiohttp.WSMsgType.TEXT:
+                    # RESPONSE, PONG, and the first messages of the topics
+                    self.parent_pool.dispatch(self, message.data)
+                elif message.type in CLOSED_TYPES:
+                    raise aiohttp.ClientConnectionError("closed while subscribing")
 
-    def listen(self, topic, auth_token=None):
-        data = {"topics": [str(topic)]}
-        if topic.is_user_topic() and auth_token is not None:
-            data["auth_token"] = auth_token
-        nonce = create_nonce()
-        self.send({"type": "LISTEN", "nonce": nonce, "data": data})
+            # Submitted or dropped while this connection was subscribing
+            late = [topic for topic in self.topics if topic not in topics]
+            if late != []:
+                await self.listen(
+                    late, self.twitch.twitch_login.get_auth_token(), ws=ws
+                )
+            dropped = [topic for topic in topics if topic not in self.topics]
+            if dropped != []:
+                await self.listen(
+                    dropped,
+                    self.twitch.twitch_login.get_auth_token(),
+                    ws=ws,
+                    request="UNLISTEN",
+                )
+        except BaseException:
+            await ws.close()
+            raise
+        return ws
 
-    def ping(self):
-        self.send({"type": "PING"})
+    async def __receive(self) -> float:
+        # Returns when the connection is lost, with the time it stopped working
+        while self.forced_close is False:
+            ws = self.__ws
+            try:
+                message = await ws.receive(
+                    timeout=max(self.__next_ping - time.time(), 0.1)
+                )
+            except asyncio.TimeoutError:
+                if ws is not self.__ws:
+                    continue
+                if self.elapsed_last_pong() > 5:
+                    logger.info(
+                        f"#{self.index} - The last PONG was received more than 5 minutes ago"
+                    )
+                    return self.last_pong
+                # We need ping for keep the connection alive
+                await self.ping()
+                continue
+
+            if message.type == aiohttp.WSMsgType.TEXT:
+                self.parent_pool.dispatch(self, message.data)
+            elif message.type in CLOSED_TYPES:
+                if ws is not self.__ws:
+                    # Closed by the swap, go on with the replacement
+                    continue
+                lost_at = time.time()
+                if self.__replacement is not None:
+                    # Lost while the replacement is being opened, wait for it
+                    await asyncio.wait([self.__replacement])
+                    if ws is not self.__ws:
+                        self.parent_pool.record_gap(self, time.time() - lost_at)
+                        continue
+                return lost_at
+        return time.time()
+
+    def reconnect(self):
+        # Thread safe: open a replacement, then close the current connection
+        self.twitch.async_client.loop.call_soon_threadsafe(self.__start_replacement)
+
+    def __start_replacement(self):
+        if (
+            self.forced_close is True
+            or self.__ws is None
+            or self.__replacement is not None
+        ):
+            return
+        self.is_reconnecting = True
+        self.__replacement = asyncio.ensure_future(self.__replace())
+
+    async def __replace(self):
+        try:
+            ws = await self.__open_with_backoff()
+            if ws is None:
+                return
+            if self.__ws is None or self.forced_close is True:
+                # The current connection has been lost and replaced by run() in the meantime
+                await ws.close()
+                return
+            previous, self.__ws = self.__ws, ws
+            if previous.closed is False:
+                # Both connections received the messages in the meantime: no gap
+                self.parent_pool.record_gap(self, 0)
+                await previous.close()
+        finally:
+            self.__replacement = None
+            self.is_reconnecting = False
+
+    async def close(self):
+        if self.__ws is not None and self.__ws.closed is False:
+            await self.__ws.close()
+
+    async def end(self):
+        self.forced_close = True
+        if self.__replacement is not None:
+            self.__replacement.cancel()
+        await self.close()
+        if self.__task is not None:
+            self.__task.cancel()
+
+    def submit(self, topic):
+        # Called from the loop. The topics submitted together are grouped in the same LISTEN frame
+        # Topic in topics should never happen. Anyway prevent any types of duplicates
+        if topic in self.topics:
+            return
+        self.topics.append(topic)
+        # Not opened yet: listened on open
+        if self.is_opened is True:
+            self.__unsent.append(topic)
+            if self.__flush is None:
+                self.__flush = asyncio.get_running_loop().call_later(
+                    LISTEN_DELAY, lambda: asyncio.ensure_future(self.__flush_unsent())
+                )
+
+    def unlisten(self, topics: list):
+        # Called from the loop. The topics not sent yet are just forgotten
+        sent = []
+        for topic in topics:
+            if topic not in self.topics:
+                continue
+            self.topics.remove(topic)
+            if topic in self.__unsent:
+                self.__unsent.remove(topic)
+            else:
+                sent.append(topic)
+        # Not opened: the next connection won't listen them
+        if self.is_opened is True and sent != []:
+            asyncio.ensure_future(
+                self.listen(
+                    sent, self.twitch.twitch_login.get_auth_token(), request="UNLISTEN"
+                )
+            )
+
+    async def __flush_unsent(self):
+        self.__flush = None
+        topics, self.__unsent = self.__unsent, []
+        await self.listen(topics, self.twitch.twitch_login.get_auth_token())
+
+    async def listen(
+        self, topics: list, auth_token=None, ws=None, request="LISTEN"
+    ) -> list:
+        # Returns the nonces of the LISTEN (or UNLISTEN) frames sent
+        # The auth token is sent only with the user topics, in their own frames
+        user_topics = [topic for topic in topics if topic.is_user_topic()]
+        channel_topics = [topic for topic in topics if not topic.is_user_topic()]
+        nonces = []
+        for group, token in [(user_topics, auth_token), (channel_topics, None)]:
+            for start in range(0, len(group), LISTEN_MAX_TOPICS):
+                end = start + LISTEN_MAX_TOPICS
+                frame = group[start:end]
+                data = {"topics": [str(topic) for topic in frame]}
+                if token is not None:
+                    data["auth_token"] = token
+                nonce = create_nonce()
+                self.__listens[nonce] = frame
+                nonces.append(nonce)
+                await self.send({"type": request, "nonce": nonce, "data": data}, ws=ws)
+        return nonces
+
+    def listen_response(self, nonce) -> list:
+        # Topics of the LISTEN frame answered by the RESPONSE with this nonce
+        return self.__listens.pop(nonce, [])
+
+    async def ping(self, ws=None):
+        await self.send({"type": "PING"}, ws=ws)
         self.last_ping = time.time()
+        self.__next_ping = self.last_ping + secrets.SystemRandom().uniform(25, 30)
 
-    def send(self, request):
+    async def send(self, request, ws=None):
+        # On the current connection by default
+        ws = self.__ws if ws is None else ws
+        if ws is None or ws.closed is True:
+            return
         try:
             request_str = json.dumps(request, separators=(",", ":"))
             logger.debug(f"#{self.index} - Send: {request_str}")
-            super().send(request_str)
-        except WebSocketConnectionClosedException:
-            self.is_closed = True
+            await ws.send_str(request_str)
+        except (aiohttp.ClientError, ConnectionResetError):
+            if ws is self.__ws:
+                self.is_closed = True
 
     def elapsed_last_pong(self):
         return (time.time() - self.last_pong) // 60
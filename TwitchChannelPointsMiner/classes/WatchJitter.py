@@ -0,0 +1,50 @@
+import logging
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+
+class WatchJitter(object):
+    """
+    Distance between two successful minute-watched events of the same channel, compared to the expected interval.
+    A channel watched without interruptions should have an average jitter close to zero.
+    """
+
+    __slots__ = ["interval", "__channels", "__lock"]
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        # channel -> {"last", "events", "total", "max"}
+        self.__channels = {}
+        self.__lock = Lock()
+
+    def record(self, channel: str, timestamp: float):
+        with self.__lock:
+            stats = self.__channels.setdefault(
+                channel, {"last": None, "events": 0, "total": 0.0, "max": 0.0}
+            )
+            # A gap longer than two intervals means that we stopped watching the channel, it's not jitter
+            if (
+                stats["last"] is not None
+                and timestamp - stats["last"] < self.interval * 2
+            ):
+                jitter = abs(timestamp - stats["last"] - self.interval)
+                stats["events"] += 1
+                stats["total"] += jitter
+                stats["max"] = max(stats["max"], jitter)
+            stats["last"] = timestamp
+
+    def stats(self) -> dict:
+        with self.__lock:
+            return {
+                channel: {
+                    "events": stats["events"],
+                    "avg": (
+                        round(stats["total"] / stats["events"], 3)
+                        if stats["events"] > 0
+                        else 0
+                    ),
+                    "max": round(stats["max"], 3),
+                }
+                for channel, stats in self.__channels.items()
+            }
@@ -0,0 +1,199 @@
+import heapq
+import logging
+import time
+from threading import Lock
+
+from TwitchChannelPointsMiner.classes.Settings import Priority
+from TwitchChannelPointsMiner.classes.StreamerRegistry import StreamerRegistry
+
+logger = logging.getLogger(__name__)
+
+
+class WatchSelector(object):
+    """
+    Incremental version of the watch selection of send_minute_watched_events.
+    Every priority has its own heap of candidates, kept up to date with update(streamer) when a streamer changes
+    (online/offline, balance, multipliers, campaigns, watch streak) instead of scanning and sorting all the streamers each tick.
+    An entry is checked again when it reaches the top of its heap: outdated keys are fixed, streamers not eligible anymore are dropped,
+    and the ones just waiting for a time condition (online for less than 30s, offline for less than 30m) are kept.
+    A full resync every resync_interval seconds recovers the changes nobody told us about.
+    The heaps hold the handles of the StreamerRegistry, they keep the list order and survive the removal of a streamer.
+    """
+
+    __slots__ = [
+        "streamers",
+        "resync_interval",
+        "last_resync",
+        "__heaps",
+        "__keys",
+        "__lock",
+    ]
+
+    def __init__(self, resync_interval: int = 5 * 60):
+        self.streamers = StreamerRegistry()
+        self.resync_interval = resync_interval
+        self.last_resync = 0
+        self.__heaps = {}
+        self.__keys = {
+            Priority.ORDER: self.__key_online,
+            Priority.POINTS_ASCENDING: self.__key_points_ascending,
+            Priority.POINTS_DESCENDING: self.__key_points_descending,
+            Priority.STREAK: self.__key_streak,
+            Priority.DROPS: self.__key_drops,
+            Priority.SUBSCRIBED: self.__key_subscribed,
+        }
+        self.__lock = Lock()
+
+    def track(self, streamers: StreamerRegistry):
+        # The registry is shared with the miner, the streamers added later (progressive startup) are found by update()
+        with self.__lock:
+            self.streamers = streamers
+        self.resync()
+
+    def resync(self):
+        with self.__lock:
+            self.__heaps = {key: [] for key in self.__heaps}
+            for handle, streamer in self.streamers.items():
+                self.__push(handle, streamer)
+            self.last_resync = time.time()
+
+    def update(self, streamer):
+        with self.__lock:
+            handle = self.streamers.handle(streamer)
+            if handle is not None:
+                self.__push(handle, streamer)
+
+    # === KEYS === #
+    # Each method returns the key of the streamer in the heap of the priority, None if the streamer is not a candidate.
+    # The handle is the last item of every key, it breaks the ties in list order
+
+    @staticmethod
+    def __key_online(streamer, handle):
+        return (handle,) if streamer.is_online is True else None
+
+    @staticmethod
+    def __key_points_ascending(streamer, handle):
+        if streamer.is_online is True:
+            return (streamer.channel_points, handle)
+        return None
+
+    @staticmethod
+    def __key_points_descending(streamer, handle):
+        if streamer.is_online is True:
+            return (-streamer.channel_points, handle)
+        return None
+
+    @staticmethod
+    def __key_streak(streamer, handle):
+        if (
+            streamer.is_online is True
+            and streamer.settings.watch_streak is True
+            and streamer.stream.watch_streak_missing is True
+            # fix #425
+            and streamer.stream.minute_watched < 7
+        ):
+            return (handle,)
+        return None
+
+    @staticmethod
+    def __key_drops(streamer, handle):
+        return (handle,) if streamer.drops_condition() is True else None
+
+    @staticmethod
+    def __key_subscribed(streamer, handle):
+        if streamer.is_online is True and streamer.viewer_has_points_multiplier():
+            return (-streamer.total_points_multiplier(), handle)
+        return None
+
+    def __push(self, handle, streamer):
+        for prior, key_function in self.__keys.items():
+            key = key_function(streamer, handle)
+            if key is not None:
+                heapq.heappush(self.__heaps.setdefault(prior, []), key)
+
+    # === TIME CONDITIONS === #
+
+    @staticmethod
+    def watchable(streamer, now) -> bool:
+        # Wait 30 seconds after the online event, the API is not updated yet
+        return streamer.online_at == 0 or (now - streamer.online_at) > 30
+
+    @staticmethod
+    def streak_ready(streamer, now) -> bool:
+        # Each stream must be at least 30 minutes after the end of the previous one
+        return streamer.offline_at == 0 or ((now - streamer.offline_at) // 60) > 30
+
+    # === SELECTION === #
+
+    def online(self) -> list:
+        # Handles of the streamers online, in list order
+        with self.__lock:
+            online = set()
+            for (handle,) in self.__heaps.get(Priority.ORDER, []):
+                streamer = self.streamers.get(handle)
+                if streamer is not None and streamer.is_online is True:
+                    online.add(handle)
+            return sorted(online)
+
+    def select(self, priority: list, max_watch_amount: int = 2) -> list:
+        if (time.time() - self.last_resync) >= self.resync_interval:
+            self.resync()
+
+        now = time.time()
+        selected = []
+        with self.__lock:
+            keys = self.__keys
+            for prior in priority:
+                if len(selected) >= max_watch_amount:
+                    break
+                if prior not in keys:
+                    continue
+                selected.extend(
+                    self.__take(
+                        prior,
+                        keys[prior],
+                        max_watch_amount - len(selected),
+                        selected,
+                        now,
+                    )
+                )
+        return selected[:max_watch_amount]
+
+    def __take(self, prior, key_function, amount, selected, now) -> list:
+        # Pop the best valid candidates of a heap. The entries only waiting for a time condition are pushed back
+        heap = self.__heaps.setdefault(prior, [])
+        taken, waiting, seen = [], [], set()
+        while heap != [] and len(taken) < amount:
+            key = heapq.heappop(heap)
+            handle = key[-1]
+            if handle in seen:
+                # Duplicated entry (more than an update before the selection)
+                continue
+            streamer = self.streamers.get(handle)
+            if streamer is None:
+                # Removed from the registry
+                continue
+            current = key_function(streamer, handle)
+            if current is None:
+                # Not a candidate anymore, update() will push it again when it changes
+                continue
+            if current != key:
+                # Outdated key (e.g. balance changed), put it back in the right place
+                heapq.heappush(heap, current)
+                continue
+            seen.add(handle)
+            waiting.append(key)
+            if (
+                handle in selected
+                or self.watchable(streamer, now) is False
+                or (
+                    prior == Priority.STREAK
+                    and self.streak_ready(streamer, now) is False
+                )
+            ):
+                continue
+            taken.append(handle)
+        # All the valid entries go back, the streamers are still candidates for the next tick
+        for key in waiting:
+            heapq.heappush(heap, key)
+        return taken
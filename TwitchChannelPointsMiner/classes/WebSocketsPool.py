@@ -1,36 +1,92 @@
+import asyncio
 import json
 import logging
 import time
+from collections import deque
 # import os
-from threading import Thread, Timer
+from concurrent.futures import ThreadPoolExecutor
+from threading import Timer
 # from pathlib import Path
 
+import aiohttp
 from dateutil import parser
 
 from TwitchChannelPointsMiner.classes.entities.CommunityGoal import CommunityGoal
 from TwitchChannelPointsMiner.classes.entities.EventPrediction import EventPrediction
 from TwitchChannelPointsMiner.classes.entities.Message import Message
+from TwitchChannelPointsMiner.classes.entities.PubsubTopic import PubsubTopic
 from TwitchChannelPointsMiner.classes.entities.Raid import Raid
-from TwitchChannelPointsMiner.classes.Settings import Events, Settings
+from TwitchChannelPointsMiner.classes.Settings import Events, Settings, StreamState
+from TwitchChannelPointsMiner.classes.TopicPlanner import MAX_CONNECTIONS, TopicPlanner
 from TwitchChannelPointsMiner.classes.TwitchWebSocket import TwitchWebSocket
 from TwitchChannelPointsMiner.constants import WEBSOCKET
-from TwitchChannelPointsMiner.utils import (
-    get_streamer_index,
-    internet_connection_available,
-)
-import secrets
 
 logger = logging.getLogger(__name__)
 
+# The topics submitted (or the state changes) within this delay are placed by the same rebalance
+REBALANCE_DELAY = 0.1
+# Messages remembered to drop the duplicates: the same message comes from both connections during a make-before-break
+SEEN_MESSAGES = 1000
+
 
 class WebSocketsPool:
-    __slots__ = ["ws", "twitch", "streamers", "events_predictions"]
+    """
+    All the PubSub connections run on the event loop of twitch.async_client, whatever their number.
+    The messages are handled by handler_workers threads: the messages of a topic always go to the same worker,
+    so they are handled in order, and a slow handler (prediction, claim) never blocks the connections.
+    The topics are placed by a TopicPlanner within max_connections connections: when they don't fit,
+    the least useful ones are not listened, and the choice is made again when a streamer goes online or offline.
+    An offline channel is only listened with video-playback-by-id (to see it going online):
+    its other topics are attached when the stream starts and detached when it ends (UNLISTEN).
+    """
 
-    def __init__(self, twitch, streamers, events_predictions):
+    __slots__ = [
+        "ws",
+        "twitch",
+        "streamers",
+        "events_predictions",
+        "handler_workers",
+        "gaps",
+        "planner",
+        "topics",
+        "deferred",
+        "__session",
+        "__executors",
+        "__rebalance",
+        "__seen",
+        "__seen_order",
+    ]
+
+    def __init__(
+        self,
+        twitch,
+        streamers,
+        events_predictions,
+        handler_workers=4,
+        max_connections=MAX_CONNECTIONS,
+    ):
         self.ws = []
         self.twitch = twitch
         self.streamers = streamers
         self.events_predictions = events_predictions
+        self.handler_workers = handler_workers
+        # Seconds without a working connection, one entry per reconnection (0 for a make-before-break)
+        self.gaps = []
+        self.planner = TopicPlanner(streamers, max_connections=max_connections)
+        # str(topic) -> topic, all the topics submitted, listened or not
+        self.topics = {}
+        # Topics over the budget at the last rebalance
+        self.deferred = 0
+        # (topic, message) of the last SEEN_MESSAGES messages, only used from the loop
+        self.__seen = set()
+        self.__seen_order = deque()
+        self.__session = None
+        self.__rebalance = None
+        # One single thread executor per worker, a topic is bound to a worker
+        self.__executors = [
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"PubSub handler #{i}")
+            for i in range(0, handler_workers)
+        ]
 
     """
     API Limits
@@ -40,163 +96,217 @@ class WebSocketsPool:
     """
 
     def submit(self, topic):
-        # Check if we need to create a new WebSocket instance
-        if self.ws == [] or len(self.ws[-1].topics) >= 50:
-            self.ws.append(self.__new(len(self.ws)))
-            self.__start(-1)
+        # Thread safe and non blocking, the connections are only touched from the loop (in submission order)
+        self.twitch.async_client.submit(self.__submit(topic))
 
-        self.__submit(-1, topic)
-
-    def __submit(self, index, topic):
+    async def __submit(self, topic):
         # Topic in topics should never happen. Anyway prevent any types of duplicates
-        if topic not in self.ws[index].topics:
-            self.ws[index].topics.append(topic)
+        if str(topic) in self.topics:
+            return
+        self.topics[str(topic)] = topic
+        self.__schedule_rebalance()
 
-        if self.ws[index].is_opened is False:
-            self.ws[index].pending_topics.append(topic)
-        else:
-            self.ws[index].listen(topic, self.twitch.twitch_login.get_auth_token())
-
-    def __new(self, index):
-        return TwitchWebSocket(
-            index=index,
-            parent_pool=self,
-            url=WEBSOCKET,
-            on_message=WebSocketsPool.on_message,
-            on_open=WebSocketsPool.on_open,
-            on_error=WebSocketsPool.on_error,
-            on_close=WebSocketsPool.on_close
-            # on_close=WebSocketsPool.handle_reconnection, # Do nothing.
-        )
+    def remove(self, topic):
+        # Thread safe and non blocking, the topic is unlistened by the next rebalance
+        self.twitch.async_client.submit(self.__remove(topic))
 
-    def __start(self, index):
-        if Settings.disable_ssl_cert_verification is True:
-            import ssl
+    async def __remove(self, topic):
+        if self.topics.pop(str(topic), None) is not None:
+            self.__schedule_rebalance()
 
-            thread_ws = Thread(
-                target=lambda: self.ws[index].run_forever(
-                    sslopt={"cert_reqs": ssl.CERT_NONE}
-                )
-            )
-            logger.warning("SSL certificate verification is disabled! Be aware!")
-        else:
-            thread_ws = Thread(target=lambda: self.ws[index].run_forever())
-        thread_ws.daemon = True
-        thread_ws.name = f"WebSocket #{self.ws[index].index}"
-        thread_ws.start()
+    def rebalance(self):
+        # Thread safe: choose again the topics to listen
+        self.twitch.async_client.submit(self.__rebalance_later())
 
-    def end(self):
-        for index in range(0, len(self.ws)):
-            self.ws[index].forced_close = True
-            self.ws[index].close()
+    async def __rebalance_later(self):
+        self.__schedule_rebalance()
 
     @staticmethod
-    def on_open(ws):
-        def run():
-            ws.is_opened = True
-            ws.ping()
-
-            for topic in ws.pending_topics:
-                ws.listen(topic, ws.twitch.twitch_login.get_auth_token())
-
-            while ws.is_closed is False:
-                # Else: the ws is currently in reconnecting phase, you can't do ping or other operation.
-                # Probably this ws will be closed very soon with ws.is_closed = True
-                if ws.is_reconnecting is False:
-                    ws.ping()  # We need ping for keep the connection alive
-                    time.sleep(secrets.SystemRandom().uniform(25, 30))
-
-                    if ws.elapsed_last_pong() > 5:
-                        logger.info(
-                            f"#{ws.index} - The last PONG was received more than 5 minutes ago"
-                        )
-                        WebSocketsPool.handle_reconnection(ws)
-
-        thread_ws = Thread(target=run)
-        thread_ws.daemon = True
-        thread_ws.start()
+    def channel_topics(streamer) -> list:
+        # The topics of a channel that only matter while it's live, according to the settings of the streamer
+        topics = []
+        if streamer.settings.follow_raid is True:
+            topics.append(PubsubTopic("raid", streamer=streamer))
+        if streamer.settings.make_predictions is True:
+            topics.append(PubsubTopic("predictions-channel-v1", streamer=streamer))
+        if streamer.settings.claim_moments is True:
+            topics.append(
+                PubsubTopic("community-moments-channel-v1", streamer=streamer)
+            )
+        if streamer.settings.community_goals is True:
+            topics.append(
+                PubsubTopic("community-points-channel-v1", streamer=streamer)
+            )
+        return topics
 
-    @staticmethod
-    def on_error(ws, error):
-        # Connection lost | [WinError 10054] An existing connection was forcibly closed by the remote host
-        # Connection already closed | Connection is already closed (raise WebSocketConnectionClosedException)
-        logger.error(f"#{ws.index} - WebSocket error: {error}")
+    def __schedule_rebalance(self):
+        if self.__rebalance is None:
+            self.__rebalance = asyncio.get_running_loop().call_later(
+                REBALANCE_DELAY, self.__rebalance_now
+            )
 
-    @staticmethod
-    def on_close(ws, close_status_code, close_reason):
-        logger.info(f"#{ws.index} - WebSocket closed")
-        # On close please reconnect automatically
-        WebSocketsPool.handle_reconnection(ws)
+    def __rebalance_now(self):
+        self.__rebalance = None
+        kept, deferred = self.planner.plan(list(self.topics.values()))
+
+        # First make room: the topics over the budget are unlistened
+        kept_keys = set(str(topic) for topic in kept)
+        listened = set()
+        for ws in self.ws:
+            dropped = [topic for topic in ws.topics if str(topic) not in kept_keys]
+            if dropped != []:
+                ws.unlisten(dropped)
+            listened.update(str(topic) for topic in ws.topics)
+
+        # Then place the missing topics on the first connection with room, a new one if needed
+        for topic in kept:
+            if str(topic) in listened:
+                continue
+            ws = next(
+                (
+                    ws
+                    for ws in self.ws
+                    if len(ws.topics) < self.planner.topics_per_connection
+                ),
+                None,
+            )
+            if ws is None:
+                if len(self.ws) >= self.planner.max_connections:
+                    break
+                ws = TwitchWebSocket(index=len(self.ws), parent_pool=self, url=WEBSOCKET)
+                self.ws.append(ws)
+                ws.start()
+            ws.submit(topic)
+
+        if len(deferred) != self.deferred:
+            logger.info(
+                f"{len(deferred)} PubSub topics not listened, over the budget of {self.planner.max_connections} connections"
+            )
+            logger.debug(f"Not listened: {', '.join(str(topic) for topic in deferred)}")
+        self.deferred = len(deferred)
+
+    def on_stream_state(self, streamer, previous, state):
+        # StreamMonitor listener: the channel topics are attached when the stream starts, detached when it's over
+        # A streamer not registered yet is subscribed according to its state when it is
+        if (previous == StreamState.OFFLINE) == (
+            state == StreamState.OFFLINE
+        ) or streamer not in self.streamers:
+            return
+        topics = self.channel_topics(streamer)
+        for topic in topics:
+            if state == StreamState.OFFLINE:
+                self.remove(topic)
+            else:
+                self.submit(topic)
+        # Going online or offline also changes the rank of video-playback-by-id
+        if topics == [] and self.deferred > 0:
+            self.rebalance()
+
+    def session(self) -> aiohttp.ClientSession:
+        # Not the session of AsyncClient: the WebSockets would hold its (limited) connections forever
+        if self.__session is None or self.__session.closed:
+            # HTTP(S)_PROXY and NO_PROXY, as websocket-client did
+            self.__session = aiohttp.ClientSession(trust_env=True)
+        return self.__session
+
+    def record_gap(self, ws, seconds):
+        self.gaps.append(max(seconds, 0))
+        logger.info(
+            f"#{ws.index} - Reconnected to Twitch PubSub, {max(seconds, 0):.1f}s without connection"
+        )
 
-    @staticmethod
-    def handle_reconnection(ws):
-        # Reconnect only if ws.is_reconnecting is False to prevent more than 1 ws from being created
-        if ws.is_reconnecting is False:
-            # Close the current WebSocket.
-            ws.is_closed = True
-            ws.keep_running = False
-            # Reconnect only if ws.forced_close is False (replace the keep_running)
-
-            # Set the current socket as reconnecting status
-            # So the external ping check will be locked
-            ws.is_reconnecting = True
-
-            if ws.forced_close is False:
-                logger.info(
-                    f"#{ws.index} - Reconnecting to Twitch PubSub server in ~60 seconds"
-                )
-                time.sleep(30)
-
-                while internet_connection_available() is False:
-                    random_sleep = secrets.SystemRandom().randint(1, 3)
-                    logger.warning(
-                        f"#{ws.index} - No internet connection available! Retry after {random_sleep}m"
-                    )
-                    time.sleep(random_sleep * 60)
+    def gaps_stats(self) -> dict:
+        gaps = list(self.gaps)
+        return {
+            "reconnections": len(gaps),
+            "total": round(sum(gaps), 1),
+            "max": round(max(gaps), 1) if gaps != [] else 0,
+        }
 
-                # Why not create a new ws on the same array index? Let's try.
-                self = ws.parent_pool
-                # Create a new connection.
-                self.ws[ws.index] = self.__new(ws.index)
+    def end(self):
+        try:
+            self.twitch.async_client.run(self.__end(), timeout=10)
+        except Exception:
+            logger.debug("Unable to close the WebSockets", exc_info=True)
+        for executor in self.__executors:
+            executor.shutdown(wait=False)
+
+    async def __end(self):
+        if self.__rebalance is not None:
+            self.__rebalance.cancel()
+        for ws in self.ws:
+            await ws.end()
+        if self.__session is not None:
+            await self.__session.close()
+
+    def dispatch(self, ws, message):
+        # Called from the loop for every message received. A bad frame must never reach the connection task
+        logger.debug(f"#{ws.index} - Received: {message.strip()}")
+        try:
+            self.__dispatch(ws, message)
+        except Exception:
+            logger.error(
+                f"#{ws.index} - Unable to handle the message: {message}", exc_info=True
+            )
 
-                self.__start(ws.index)  # Start a new thread.
-                time.sleep(30)
+    def __dispatch(self, ws, message):
+        response = json.loads(message)
 
-                for topic in ws.topics:
-                    self.__submit(ws.index, topic)
+        if response["type"] == "PONG":
+            ws.last_pong = time.time()
+        elif response["type"] == "RECONNECT":
+            logger.info(f"#{ws.index} - Reconnection required")
+            ws.reconnect()
+        elif response["type"] == "RESPONSE":
+            # The nonce tells which topics the LISTEN was about (only known by the connection, on the loop)
+            topics = ws.listen_response(response.get("nonce"))
+            if len(response.get("error", "")) > 0:
+                response["topics"] = [str(topic) for topic in topics]
+                self.__executors[0].submit(WebSocketsPool.__handle, ws, response)
+        else:
+            topic = response.get("data", {}).get("topic", "")
+            if self.__is_duplicate(topic, response.get("data", {}).get("message")):
+                return
+            executor = self.__executors[hash(topic) % self.handler_workers]
+            executor.submit(WebSocketsPool.__handle, ws, response)
+
+    def __is_duplicate(self, topic, message) -> bool:
+        # The payload carries the type, the ids and the server time: identical payloads are the same message
+        key = (topic, message)
+        if key in self.__seen:
+            logger.debug(f"Duplicate message dropped for {topic}")
+            return True
+        self.__seen.add(key)
+        self.__seen_order.append(key)
+        if len(self.__seen_order) > SEEN_MESSAGES:
+            self.__seen.discard(self.__seen_order.popleft())
+        return False
 
     @staticmethod
-    def on_message(ws, message):
-        logger.debug(f"#{ws.index} - Received: {message.strip()}")
-        response = json.loads(message)
+    def __handle(ws, response):
+        # Nobody reads the futures of the executors
+        try:
+            WebSocketsPool.on_response(ws, response)
+        except Exception:
+            logger.error(f"Exception raised for response: {response}", exc_info=True)
 
+    @staticmethod
+    def on_response(ws, response):
         if response["type"] == "MESSAGE":
             # We should create a Message class ...
             message = Message(response["data"])
+            # The duplicates have already been dropped by dispatch, on the loop
 
-            # If we have more than one PubSub connection, messages may be duplicated
-            # Check the concatenation between message_type.top.channel_id
-            if (
-                ws.last_message_type_channel is not None
-                and ws.last_message_timestamp is not None
-                and ws.last_message_timestamp == message.timestamp
-                and ws.last_message_type_channel == message.identifier
-            ):
-                return
-
-            ws.last_message_timestamp = message.timestamp
-            ws.last_message_type_channel = message.identifier
-
-            streamer_index = get_streamer_index(ws.streamers, message.channel_id)
-            if streamer_index != -1:
+            streamer = ws.streamers.by_channel_id(message.channel_id)
+            if streamer is not None:
                 try:
                     if message.topic == "community-points-user-v1":
                         if message.type in ["points-earned", "points-spent"]:
                             balance = message.data["balance"]["balance"]
-                            ws.streamers[streamer_index].channel_points = balance
+                            streamer.channel_points = balance
                             # Analytics switch
                             if Settings.enable_analytics is True:
-                                ws.streamers[streamer_index].persistent_series(
+                                streamer.persistent_series(
                                     event_type=message.data["point_gain"]["reason_code"]
                                     if message.type == "points-earned"
                                     else "Spent"
@@ -207,38 +317,36 @@ class WebSocketsPool:
                             reason_code = message.data["point_gain"]["reason_code"]
 
                             logger.info(
-                                f"+{earned} → {ws.streamers[streamer_index]} - Reason: {reason_code}.",
+                                f"+{earned} → {streamer} - Reason: {reason_code}.",
                                 extra={
                                     "emoji": ":rocket:",
                                     "event": Events.get(f"GAIN_FOR_{reason_code}"),
                                 },
                             )
-                            ws.streamers[streamer_index].update_history(
+                            streamer.update_history(
                                 reason_code, earned
                             )
+                            # The balance and maybe the watch streak have changed
+                            ws.twitch.watch_selector.update(streamer)
                             # Analytics switch
                             if Settings.enable_analytics is True:
-                                ws.streamers[streamer_index].persistent_annotations(
+                                streamer.persistent_annotations(
                                     reason_code, f"+{earned} - {reason_code}"
                                 )
                         elif message.type == "claim-available":
                             ws.twitch.claim_bonus(
-                                ws.streamers[streamer_index],
+                                streamer,
                                 message.data["claim"]["id"],
                             )
 
                     elif message.topic == "video-playback-by-id":
                         # There is stream-up message type, but it's sent earlier than the API updates
                         if message.type == "stream-up":
-                            ws.streamers[streamer_index].stream_up = time.time()
+                            ws.twitch.stream_monitor.stream_up(streamer)
                         elif message.type == "stream-down":
-                            if ws.streamers[streamer_index].is_online is True:
-                                ws.streamers[streamer_index].set_offline()
+                            ws.twitch.stream_monitor.stream_down(streamer)
                         elif message.type == "viewcount":
-                            if ws.streamers[streamer_index].stream_up_elapsed():
-                                ws.twitch.check_streamer_online(
-                                    ws.streamers[streamer_index]
-                                )
+                            ws.twitch.stream_monitor.viewcount(streamer)
 
                     elif message.topic == "raid":
                         if message.type == "raid_update_v2":
@@ -246,12 +354,12 @@ class WebSocketsPool:
                                 message.message["raid"]["id"],
                                 message.message["raid"]["target_login"],
                             )
-                            ws.twitch.update_raid(ws.streamers[streamer_index], raid)
+                            ws.twitch.update_raid(streamer, raid)
 
                     elif message.topic == "community-moments-channel-v1":
                         if message.type == "active":
                             ws.twitch.claim_moment(
-                                ws.streamers[streamer_index], message.data["moment_id"]
+                                streamer, message.data["moment_id"]
                             )
 
                     elif message.topic == "predictions-channel-v1":
@@ -271,11 +379,13 @@ class WebSocketsPool:
                                     event_dict["prediction_window_seconds"]
                                 )
                                 # Reduce prediction window by 3/6s - Collect more accurate data for decision
-                                prediction_window_seconds = ws.streamers[
-                                    streamer_index
-                                ].get_prediction_window(prediction_window_seconds)
+                                prediction_window_seconds = (
+                                    streamer.get_prediction_window(
+                                        prediction_window_seconds
+                                    )
+                                )
                                 event = EventPrediction(
-                                    ws.streamers[streamer_index],
+                                    streamer,
                                     event_id,
                                     event_dict["title"],
                                     parser.parse(event_dict["created_at"]),
@@ -284,10 +394,9 @@ class WebSocketsPool:
                                     event_dict["outcomes"],
                                 )
                                 if (
-                                    ws.streamers[streamer_index].is_online
+                                    streamer.is_online
                                     and event.closing_bet_after(current_tmsp) > 0
                                 ):
-                                    streamer = ws.streamers[streamer_index]
                                     bet_settings = streamer.settings.bet
                                     if (
                                         bet_settings.minimum_points is None
@@ -365,19 +474,19 @@ class WebSocketsPool:
                                     },
                                 )
 
-                                ws.streamers[streamer_index].update_history(
+                                streamer.update_history(
                                     "PREDICTION", points["gained"]
                                 )
 
                                 # Remove duplicate history records from previous message sent in community-points-user-v1
                                 if event_prediction.result["type"] == "REFUND":
-                                    ws.streamers[streamer_index].update_history(
+                                    streamer.update_history(
                                         "REFUND",
                                         -points["placed"],
                                         counter=-1,
                                     )
                                 elif event_prediction.result["type"] == "WIN":
-                                    ws.streamers[streamer_index].update_history(
+                                    streamer.update_history(
                                         "PREDICTION",
                                         -points["won"],
                                         counter=-1,
@@ -386,9 +495,7 @@ class WebSocketsPool:
                                 if event_prediction.result["type"]:
                                     # Analytics switch
                                     if Settings.enable_analytics is True:
-                                        ws.streamers[
-                                            streamer_index
-                                        ].persistent_annotations(
+                                        streamer.persistent_annotations(
                                             event_prediction.result["type"],
                                             f"{ws.events_predictions[event_id].title}",
                                         )
@@ -396,28 +503,28 @@ class WebSocketsPool:
                                 event_prediction.bet_confirmed = True
                                 # Analytics switch
                                 if Settings.enable_analytics is True:
-                                    ws.streamers[streamer_index].persistent_annotations(
+                                    streamer.persistent_annotations(
                                         "PREDICTION_MADE",
                                         f"Decision: {event_prediction.bet.decision['choice']} - {event_prediction.title}",
                                     )
                     elif message.topic == "community-points-channel-v1":
                         if message.type == "community-goal-created":
                             # TODO Untested, hard to find this happening live
-                            ws.streamers[streamer_index].add_community_goal(
+                            streamer.add_community_goal(
                                 CommunityGoal.from_pubsub(message.data["community_goal"])
                             )
                         elif message.type == "community-goal-updated":
-                            ws.streamers[streamer_index].update_community_goal(
+                            streamer.update_community_goal(
                                 CommunityGoal.from_pubsub(message.data["community_goal"])
                             )
                         elif message.type == "community-goal-deleted":
                             # TODO Untested, not sure what the message format for this is,
                             #      https://github.com/sammwyy/twitch-ps/blob/master/main.js#L417
                             #      suggests that it should be just the entire, now deleted, goal model
-                            ws.streamers[streamer_index].delete_community_goal(message.data["community_goal"]["id"])
+                            streamer.delete_community_goal(message.data["community_goal"]["id"])
 
                         if message.type in ["community-goal-updated", "community-goal-created"]:
-                            ws.twitch.contribute_to_community_goals(ws.streamers[streamer_index])
+                            ws.twitch.contribute_to_community_goals(streamer)
 
                 except Exception:
                     logger.error(
@@ -428,7 +535,8 @@ class WebSocketsPool:
         elif response["type"] == "RESPONSE" and len(response.get("error", "")) > 0:
             # raise RuntimeError(f"Error while trying to listen for a topic: {response}")
             error_message = response.get("error", "")
-            logger.error(f"Error while trying to listen for a topic: {error_message}")
+            topics = ", ".join(response.get("topics", [])) or "a topic"
+            logger.error(f"Error while trying to listen for {topics}: {error_message}")
             
             # Check if the error message indicates an authentication issue (ERR_BADAUTH)
             if "ERR_BADAUTH" in error_message:
@@ -448,7 +556,7 @@ class WebSocketsPool:
 
         elif response["type"] == "RECONNECT":
             logger.info(f"#{ws.index} - Reconnection required")
-            WebSocketsPool.handle_reconnection(ws)
+            ws.reconnect()
 
         elif response["type"] == "PONG":
             ws.last_pong = time.time()
@@ -1,17 +1,17 @@
 from textwrap import dedent
 
-import requests
-
+from TwitchChannelPointsMiner.classes.HTTPPool import HTTPPool
 from TwitchChannelPointsMiner.classes.Settings import Events
 
 
 class Webhook(object):
-    __slots__ = ["endpoint", "method", "events"]
+    __slots__ = ["endpoint", "method", "events", "http_pool"]
 
-    def __init__(self, endpoint: str, method: str, events: list):
+    def __init__(self, endpoint: str, method: str, events: list, http_pool: HTTPPool = None):
         self.endpoint = endpoint
         self.method = method
         self.events = [str(e) for e in events]
+        self.http_pool = HTTPPool.shared() if http_pool is None else http_pool
 
     def send(self, message: str, event: Events) -> None:
         
@@ -19,8 +19,8 @@ class Webhook(object):
             url = self.endpoint + f"?event_name={str(event)}&message={message}" 
             
             if self.method.lower() == "get":
-                requests.get(url=url, timeout=60)
+                self.http_pool.get(url=url)
             elif self.method.lower() == "post":
-                requests.post(url=url, timeout=60)
+                self.http_pool.post(url=url)
             else:
                 raise ValueError("Invalid method, use POST or GET")
@@ -20,7 +20,8 @@ class Stream(object):
         "campaigns_ids",
         "viewers_count",
         "spade_url",
-        "payload",
+        "__payload",
+        "__encoded_payload",
         "watch_streak_missing",
         "minute_watched",
         "__last_update",
@@ -42,12 +43,31 @@ class Stream(object):
         self.__last_update = 0
 
         self.spade_url = None
-        self.payload = None
+        self.__payload = None
+        self.__encoded_payload = None
 
         self.init_watch_streak()
 
+    @property
+    def payload(self):
+        return self.__payload
+
+    @payload.setter
+    def payload(self, payload):
+        # The encoded payload is built again only if the events have changed
+        if payload != self.__payload:
+            self.__payload = payload
+            self.__encoded_payload = None
+
     def encode_payload(self) -> dict:
-        json_event = json.dumps(self.payload, separators=(",", ":"))
+        if self.__encoded_payload is None:
+            self.__encoded_payload = Stream.encode_events(self.__payload)
+        return self.__encoded_payload
+
+    @staticmethod
+    def encode_events(events: list) -> dict:
+        # The spade endpoint accepts many events in the same request
+        json_event = json.dumps(events, separators=(",", ":"))
         return {"data": (b64encode(json_event.encode("utf-8"))).decode("utf-8")}
 
     def update(self, broadcast_id, title, game, tags, viewers_count):
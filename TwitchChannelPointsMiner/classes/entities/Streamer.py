@@ -8,7 +8,7 @@ from threading import Lock
 from TwitchChannelPointsMiner.classes.Chat import ChatPresence, ThreadChat
 from TwitchChannelPointsMiner.classes.entities.Bet import BetSettings, DelayMode
 from TwitchChannelPointsMiner.classes.entities.Stream import Stream
-from TwitchChannelPointsMiner.classes.Settings import Events, Settings
+from TwitchChannelPointsMiner.classes.Settings import Events, Settings, StreamState
 from TwitchChannelPointsMiner.constants import URL
 from TwitchChannelPointsMiner.utils import _millify
 
@@ -74,7 +74,8 @@ class Streamer(object):
         "channel_id",
         "settings",
         "is_online",
-        "stream_up",
+        "state",
+        "state_at",
         "online_at",
         "offline_at",
         "channel_points",
@@ -95,7 +96,9 @@ class Streamer(object):
         self.channel_id: str = ""
         self.settings = settings
         self.is_online = False
-        self.stream_up = 0
+        # Driven by the StreamMonitor, is_online is True only in StreamState.ONLINE
+        self.state = StreamState.OFFLINE
+        self.state_at = 0
         self.online_at = 0
         self.offline_at = 0
         self.channel_points = 0
@@ -173,9 +176,6 @@ class Streamer(object):
         if reason_code == "WATCH_STREAK":
             self.stream.watch_streak_missing = False
 
-    def stream_up_elapsed(self):
-        return self.stream_up == 0 or ((time.time() - self.stream_up) > 120)
-
     def drops_condition(self):
         return (
             self.settings.claim_drops is True
@@ -1,3 +1,5 @@
+import json
+
 # Twitch endpoints
 URL = "https://www.twitch.tv"               # Browser, Apps
 # URL = "https://m.twitch.tv"               # Mobile Browser
@@ -37,194 +39,178 @@ GITHUB_url = (
 )
 
 
+class GQLOperation(object):
+    # Immutable and precompiled persisted query.
+    # operationName and extensions are encoded only once, every request serializes only its variables.
+    __slots__ = ["operation_name", "sha256_hash", "_prefix", "_default_variables"]
+
+    def __init__(self, operation_name: str, sha256_hash: str, variables: dict = None):
+        object.__setattr__(self, "operation_name", operation_name)
+        object.__setattr__(self, "sha256_hash", sha256_hash)
+        template = json.dumps(
+            {
+                "operationName": operation_name,
+                "extensions": {
+                    "persistedQuery": {"version": 1, "sha256Hash": sha256_hash}
+                },
+            },
+            separators=(",", ":"),
+        )
+        # Remove the last curly bracket, the variables will be appended at the end
+        object.__setattr__(
+            self, "_prefix", template[:-1].encode("utf-8") + b',"variables":'
+        )
+        object.__setattr__(
+            self,
+            "_default_variables",
+            json.dumps(
+                {} if variables is None else variables, separators=(",", ":")
+            ).encode("utf-8"),
+        )
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self.operation_name} is immutable")
+
+    def __repr__(self):
+        return f"GQLOperation({self.operation_name})"
+
+    @property
+    def variables(self) -> dict:
+        # Always a fresh copy, the default variables can't be changed
+        return json.loads(self._default_variables)
+
+    def request(self, variables: dict = None) -> "GQLRequest":
+        return GQLRequest(self, variables)
+
+    def encode(self, variables: dict = None) -> bytes:
+        return (
+            self._prefix
+            + (
+                self._default_variables
+                if variables is None
+                else json.dumps(variables, separators=(",", ":")).encode("utf-8")
+            )
+            + b"}"
+        )
+
+
+class GQLRequest(object):
+    __slots__ = ["operation", "variables", "_body"]
+
+    def __init__(self, operation: GQLOperation, variables: dict = None):
+        self.operation = operation
+        self.variables = variables
+        self._body = None
+
+    @property
+    def operation_name(self) -> str:
+        return self.operation.operation_name
+
+    def encode(self) -> bytes:
+        # The variables must not be changed after the first encode
+        if self._body is None:
+            self._body = self.operation.encode(self.variables)
+        return self._body
+
+    @staticmethod
+    def encode_batch(requests: list) -> bytes:
+        return b"[" + b",".join(request.encode() for request in requests) + b"]"
+
+    def __repr__(self):
+        return self.encode().decode("utf-8")
+
+
 class GQLOperations:
     url = "https://gql.twitch.tv/gql"
     integrity_url = "https://gql.twitch.tv/integrity"
-    WithIsStreamLiveQuery = {
-        "operationName": "WithIsStreamLiveQuery",
-        "extensions": {
-            "persistedQuery": {
-                "version": 1,
-                "sha256Hash": "04e46329a6786ff3a81c01c50bfa5d725902507a0deb83b0edbf7abe7a3716ea",
-            }
-        },
-    }
-    PlaybackAccessToken = {
-        "operationName": "PlaybackAccessToken",
-        "extensions": {
-            "persistedQuery": {
-                "version": 1,
-                "sha256Hash": "3093517e37e4f4cb48906155bcd894150aef92617939236d2508f3375ab732ce",
-            }
-        },
-    }
-    VideoPlayerStreamInfoOverlayChannel = {
-        "operationName": "VideoPlayerStreamInfoOverlayChannel",
-        "extensions": {
-            "persistedQuery": {
-                "version": 1,
-                "sha256Hash": "198492e0857f6aedead9665c81c5a06d67b25b58034649687124083ff288597d",
-            }
-        },
-    }
-    ClaimCommunityPoints = {
-        "operationName": "ClaimCommunityPoints",
-        "extensions": {
-            "persistedQuery": {
-                "version": 1,
-                "sha256Hash": "46aaeebe02c99afdf4fc97c7c0cba964124bf6b0af229395f1f6d1feed05b3d0",
-            }
-        },
-    }
-    CommunityMomentCallout_Claim = {
-        "operationName": "CommunityMomentCallout_Claim",
-        "extensions": {
-            "persistedQuery": {
-                "version": 1,
-                "sha256Hash": "e2d67415aead910f7f9ceb45a77b750a1e1d9622c936d832328a0689e054db62",
-            }
-        },
-    }
-    DropsPage_ClaimDropRewards = {
-        "operationName": "DropsPage_ClaimDropRewards",
-        "extensions": {
-            "persistedQuery": {
-                "version": 1,
-                "sha256Hash": "a455deea71bdc9015b78eb49f4acfbce8baa7ccbedd28e549bb025bd0f751930",
-            }
-        },
-    }
-    ChannelPointsContext = {
-        "operationName": "ChannelPointsContext",
-        "extensions": {
-            "persistedQuery": {
-                "version": 1,
-                "sha256Hash": "1530a003a7d374b0380b79db0be0534f30ff46e61cffa2bc0e2468a909fbc024",
-            }
-        },
-    }
-    JoinRaid = {
-        "operationName": "JoinRaid",
-        "extensions": {
-            "persistedQuery": {
-                "version": 1,
-                "sha256Hash": "c6a332a86d1087fbbb1a8623aa01bd1313d2386e7c63be60fdb2d1901f01a4ae",
-            }
-        },
-    }
-    ModViewChannelQuery = {
-        "operationName": "ModViewChannelQuery",
-        "extensions": {
-            "persistedQuery": {
-                "version": 1,
-                "sha256Hash": "df5d55b6401389afb12d3017c9b2cf1237164220c8ef4ed754eae8188068a807",
-            }
-        },
-    }
-    Inventory = {
-        "operationName": "Inventory",
-        "variables": {"fetchRewardCampaigns": True},
-        # "variables": {},
-        "extensions": {
-            "persistedQuery": {
-                "version": 1,
-                "sha256Hash": "d86775d0ef16a63a33ad52e80eaff963b2d5b72fada7c991504a57496e1d8e4b",
-            }
-        },
-    }
-    MakePrediction = {
-        "operationName": "MakePrediction",
-        "extensions": {
-            "persistedQuery": {
-                "version": 1,
-                "sha256Hash": "b44682ecc88358817009f20e69d75081b1e58825bb40aa53d5dbadcc17c881d8",
-            }
-        },
-    }
-    ViewerDropsDashboard = {
-        "operationName": "ViewerDropsDashboard",
-        # "variables": {},
-        "variables": {"fetchRewardCampaigns": True},
-        "extensions": {
-            "persistedQuery": {
-                "version": 1,
-                "sha256Hash": "5a4da2ab3d5b47c9f9ce864e727b2cb346af1e3ea8b897fe8f704a97ff017619",
-            }
-        },
-    }
-    DropCampaignDetails = {
-        "operationName": "DropCampaignDetails",
-        "extensions": {
-            "persistedQuery": {
-                "version": 1,
-                "sha256Hash": "f6396f5ffdde867a8f6f6da18286e4baf02e5b98d14689a69b5af320a4c7b7b8",
-            }
-        },
-    }
-    DropsHighlightService_AvailableDrops = {
-        "operationName": "DropsHighlightService_AvailableDrops",
-        "extensions": {
-            "persistedQuery": {
-                "version": 1,
-                "sha256Hash": "9a62a09bce5b53e26e64a671e530bc599cb6aab1e5ba3cbd5d85966d3940716f",
-            }
-        },
-    }
-    GetIDFromLogin = {
-        "operationName": "GetIDFromLogin",
-        "variables": {"login": None},
-        "extensions": {
-            "persistedQuery": {
-                "version": 1,
-                "sha256Hash": "94e82a7b1e3c21e186daa73ee2afc4b8f23bade1fbbff6fe8ac133f50a2f58ca",
-            }
-        },
-    }
-    PersonalSections = (
-        {
-            "operationName": "PersonalSections",
-            "variables": {
-                "input": {
-                    "sectionInputs": ["FOLLOWED_SECTION"],
-                    "recommendationContext": {"platform": "web"},
-                },
-                "channelLogin": None,
-                "withChannelUser": False,
-                "creatorAnniversariesExperimentEnabled": False,
-            },
-            "extensions": {
-                "persistedQuery": {
-                    "version": 1,
-                    "sha256Hash": "9fbdfb00156f754c26bde81eb47436dee146655c92682328457037da1a48ed39",
-                }
+    WithIsStreamLiveQuery = GQLOperation(
+        "WithIsStreamLiveQuery",
+        "04e46329a6786ff3a81c01c50bfa5d725902507a0deb83b0edbf7abe7a3716ea",
+    )
+    PlaybackAccessToken = GQLOperation(
+        "PlaybackAccessToken",
+        "3093517e37e4f4cb48906155bcd894150aef92617939236d2508f3375ab732ce",
+    )
+    VideoPlayerStreamInfoOverlayChannel = GQLOperation(
+        "VideoPlayerStreamInfoOverlayChannel",
+        "198492e0857f6aedead9665c81c5a06d67b25b58034649687124083ff288597d",
+    )
+    ClaimCommunityPoints = GQLOperation(
+        "ClaimCommunityPoints",
+        "46aaeebe02c99afdf4fc97c7c0cba964124bf6b0af229395f1f6d1feed05b3d0",
+    )
+    CommunityMomentCallout_Claim = GQLOperation(
+        "CommunityMomentCallout_Claim",
+        "e2d67415aead910f7f9ceb45a77b750a1e1d9622c936d832328a0689e054db62",
+    )
+    DropsPage_ClaimDropRewards = GQLOperation(
+        "DropsPage_ClaimDropRewards",
+        "a455deea71bdc9015b78eb49f4acfbce8baa7ccbedd28e549bb025bd0f751930",
+    )
+    ChannelPointsContext = GQLOperation(
+        "ChannelPointsContext",
+        "1530a003a7d374b0380b79db0be0534f30ff46e61cffa2bc0e2468a909fbc024",
+    )
+    JoinRaid = GQLOperation(
+        "JoinRaid",
+        "c6a332a86d1087fbbb1a8623aa01bd1313d2386e7c63be60fdb2d1901f01a4ae",
+    )
+    ModViewChannelQuery = GQLOperation(
+        "ModViewChannelQuery",
+        "df5d55b6401389afb12d3017c9b2cf1237164220c8ef4ed754eae8188068a807",
+    )
+    Inventory = GQLOperation(
+        "Inventory",
+        "d86775d0ef16a63a33ad52e80eaff963b2d5b72fada7c991504a57496e1d8e4b",
+        # variables={},
+        variables={"fetchRewardCampaigns": True},
+    )
+    MakePrediction = GQLOperation(
+        "MakePrediction",
+        "b44682ecc88358817009f20e69d75081b1e58825bb40aa53d5dbadcc17c881d8",
+    )
+    ViewerDropsDashboard = GQLOperation(
+        "ViewerDropsDashboard",
+        "5a4da2ab3d5b47c9f9ce864e727b2cb346af1e3ea8b897fe8f704a97ff017619",
+        # variables={},
+        variables={"fetchRewardCampaigns": True},
+    )
+    DropCampaignDetails = GQLOperation(
+        "DropCampaignDetails",
+        "f6396f5ffdde867a8f6f6da18286e4baf02e5b98d14689a69b5af320a4c7b7b8",
+    )
+    DropsHighlightService_AvailableDrops = GQLOperation(
+        "DropsHighlightService_AvailableDrops",
+        "9a62a09bce5b53e26e64a671e530bc599cb6aab1e5ba3cbd5d85966d3940716f",
+    )
+    GetIDFromLogin = GQLOperation(
+        "GetIDFromLogin",
+        "94e82a7b1e3c21e186daa73ee2afc4b8f23bade1fbbff6fe8ac133f50a2f58ca",
+        variables={"login": None},
+    )
+    PersonalSections = GQLOperation(
+        "PersonalSections",
+        "9fbdfb00156f754c26bde81eb47436dee146655c92682328457037da1a48ed39",
+        variables={
+            "input": {
+                "sectionInputs": ["FOLLOWED_SECTION"],
+                "recommendationContext": {"platform": "web"},
             },
+            "channelLogin": None,
+            "withChannelUser": False,
+            "creatorAnniversariesExperimentEnabled": False,
         },
     )
-    ChannelFollows = {
-        "operationName": "ChannelFollows",
-        "variables": {"limit": 100, "order": "ASC"},
-        "extensions": {
-            "persistedQuery": {
-                "version": 1,
-                "sha256Hash": "eecf815273d3d949e5cf0085cc5084cd8a1b5b7b6f7990cf43cb0beadf546907",
-            }
-        },
-    }
-    UserPointsContribution = {
-        "operationName": "UserPointsContribution",
-        "extensions": {
-            "persistedQuery": {
-                "version": 1,
-                "sha256Hash": "23ff2c2d60708379131178742327ead913b93b1bd6f665517a6d9085b73f661f"
-            }
-        }
-    }
-    ContributeCommunityPointsCommunityGoal = {
-        "operationName": "ContributeCommunityPointsCommunityGoal",
-        "extensions": {
-            "persistedQuery": {
-                "version": 1,
-                "sha256Hash": "5774f0ea5d89587d73021a2e03c3c44777d903840c608754a1be519f51e37bb6"
-            }
-        }
-    }
+    ChannelFollows = GQLOperation(
+        "ChannelFollows",
+        "eecf815273d3d949e5cf0085cc5084cd8a1b5b7b6f7990cf43cb0beadf546907",
+        variables={"limit": 100, "order": "ASC"},
+    )
+    UserPointsContribution = GQLOperation(
+        "UserPointsContribution",
+        "23ff2c2d60708379131178742327ead913b93b1bd6f665517a6d9085b73f661f",
+    )
+    ContributeCommunityPointsCommunityGoal = GQLOperation(
+        "ContributeCommunityPointsCommunityGoal",
+        "5774f0ea5d89587d73021a2e03c3c44777d903840c608754a1be519f51e37bb6",
+    )
@@ -1,14 +1,15 @@
 import platform
 import re
 import socket
+import string
 import time
 from copy import deepcopy
 from datetime import datetime, timezone
 from os import path
 
-import requests
 from millify import millify
 
+from TwitchChannelPointsMiner.classes.HTTPPool import HTTPPool
 from TwitchChannelPointsMiner.constants import USER_AGENTS, GITHUB_url
 import secrets
 
@@ -17,15 +18,6 @@ def _millify(input, precision=2):
     return millify(input, precision)
 
 
-def get_streamer_index(streamers: list, channel_id) -> int:
-    try:
-        return next(
-            i for i, x in enumerate(streamers) if str(x.channel_id) == str(channel_id)
-        )
-    except StopIteration:
-        return -1
-
-
 def float_round(number, ndigits=2):
     return round(float(number), ndigits)
 
@@ -40,19 +32,16 @@ def server_time(message_data):
     )
 
 
+NONCE_ALPHABET = string.digits + string.ascii_lowercase + string.ascii_uppercase
+
+
 # https://en.wikipedia.org/wiki/Cryptographic_nonce
 def create_nonce(length=30) -> str:
-    nonce = ""
-    for i in range(length):
-        char_index = secrets.SystemRandom().randrange(0, 10 + 26 + 26)
-        if char_index < 10:
-            char = chr(ord("0") + char_index)
-        elif char_index < 10 + 26:
-            char = chr(ord("a") + char_index - 10)
-        else:
-            char = chr(ord("A") + char_index - 26 - 10)
-        nonce += char
-    return nonce
+    # A single read of the OS random generator for the whole nonce, it only has to be unique
+    return "".join(
+        NONCE_ALPHABET[byte % len(NONCE_ALPHABET)]
+        for byte in secrets.token_bytes(length)
+    )
 
 # for mobile-token
 
@@ -165,11 +154,11 @@ def create_chunks(lst, n):
 
 
 def download_file(name, fpath):
-    r = requests.get(
+    r = HTTPPool.shared().get(
         path.join(GITHUB_url, name),
         headers={"User-Agent": get_user_agent("FIREFOX")},
         stream=True,
-        timeout=60)
+    )
     if r.status_code == 200:
         with open(fpath, "wb") as f:
             for chunk in r.iter_content(chunk_size=1024):
@@ -195,14 +184,14 @@ def check_versions():
     except Exception:
         current_version = "0.0.0"
     try:
-        r = requests.get(
+        r = HTTPPool.shared().get(
             "/".join(
                 [
                     s.strip("/")
                     for s in [GITHUB_url, "TwitchChannelPointsMiner", "__init__.py"]
                 ]
-            ),
-            timeout=60)
+            )
+        )
         github_version = init2dict(r.text)
         github_version = (
             github_version["version"] if "version" in github_version else "0.0.0"
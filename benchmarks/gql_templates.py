@@ -0,0 +1,55 @@
+# Compare the old deepcopy + json.dumps path with the precompiled GQLOperation templates.
+# Usage (from the root of the repository): python -m benchmarks.gql_templates [requests]
+
+import copy
+import json
+import sys
+import time
+
+from TwitchChannelPointsMiner.constants import GQLOperations
+
+# Same shape of the dictionaries used before the templates
+LEGACY_OPERATION = {
+    "operationName": GQLOperations.ChannelPointsContext.operation_name,
+    "extensions": {
+        "persistedQuery": {
+            "version": 1,
+            "sha256Hash": GQLOperations.ChannelPointsContext.sha256_hash,
+        }
+    },
+}
+
+
+def legacy(count):
+    for i in range(count):
+        json_data = copy.deepcopy(LEGACY_OPERATION)
+        json_data["variables"] = {"channelLogin": f"streamer{i}"}
+        # What requests does with json=json_data
+        json.dumps(json_data).encode("utf-8")
+
+
+def templates(count):
+    for i in range(count):
+        GQLOperations.ChannelPointsContext.request(
+            {"channelLogin": f"streamer{i}"}
+        ).encode()
+
+
+def measure(function, count, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(count)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    legacy_time = measure(legacy, count)
+    templates_time = measure(templates, count)
+    print(f"{count} requests (best of 5)")
+    print(f"deepcopy + json.dumps: {legacy_time * 1000:.1f}ms")
+    print(f"precompiled templates: {templates_time * 1000:.1f}ms")
+    print(f"speed-up: x{legacy_time / templates_time:.1f}")
@@ -0,0 +1,487 @@
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import random
+import tempfile
+import time
+from base64 import b64decode
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from TwitchChannelPointsMiner.classes import HLSCache as hls_cache_module
+from TwitchChannelPointsMiner.classes import StreamMonitor as stream_monitor_module
+from TwitchChannelPointsMiner.classes import Twitch as twitch_module
+from TwitchChannelPointsMiner.classes import WatchSelector as watch_selector_module
+from TwitchChannelPointsMiner.classes.Chat import ChatPresence
+from TwitchChannelPointsMiner.classes.entities import Stream as stream_module
+from TwitchChannelPointsMiner.classes.entities import Streamer as streamer_module
+from TwitchChannelPointsMiner.classes.entities.Streamer import (
+    Streamer,
+    StreamerSettings,
+)
+from TwitchChannelPointsMiner.classes.GQLCache import GQLCache
+from TwitchChannelPointsMiner.classes.GQLScheduler import GQLScheduler
+from TwitchChannelPointsMiner.classes.Settings import Priority
+from TwitchChannelPointsMiner.classes.StreamerRegistry import StreamerRegistry
+from TwitchChannelPointsMiner.classes.Twitch import Twitch
+from TwitchChannelPointsMiner.constants import GQLOperations
+
+logger = logging.getLogger(__name__)
+
+# Modules whose "time" is replaced by the virtual clock while the simulation runs
+SIMULATED_MODULES = [
+    twitch_module,
+    watch_selector_module,
+    hls_cache_module,
+    stream_monitor_module,
+    streamer_module,
+    stream_module,
+]
+
+
+@contextmanager
+def virtual_time(clock, modules: list = None):
+    # The modules see the clock as their "time" module, until the end of the block
+    modules = SIMULATED_MODULES if modules is None else modules
+    originals = {module: module.time for module in modules}
+    for module in modules:
+        module.time = clock
+    try:
+        yield clock
+    finally:
+        for module, original in originals.items():
+            module.time = original
+
+
+# Twitch rewards (approximated): 10 points every 5 minutes watched, a 50 points bonus every 15 minutes
+POINTS_PER_MINUTE = 2
+BONUS_POINTS = 50
+BONUS_INTERVAL = 15 * 60
+WATCH_STREAK_POINTS = 450
+WATCH_STREAK_MINUTES = 6
+
+
+class VirtualClock(object):
+    """
+    Replacement of the time module: sleep() doesn't wait, it moves the clock forward
+    and runs the events scheduled in the meantime.
+    """
+
+    __slots__ = ["now", "end", "on_end", "__events", "__sequence"]
+
+    def __init__(self, start: float = 1_600_000_000.0):
+        self.now = start
+        self.end = None
+        self.on_end = None
+        self.__events = []
+        self.__sequence = itertools.count()
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def perf_counter(self) -> float:
+        return self.now
+
+    def schedule(self, at: float, callback, *args):
+        heapq.heappush(self.__events, (at, next(self.__sequence), callback, args))
+
+    def sleep(self, seconds: float):
+        target = self.now + max(seconds, 0)
+        while self.__events != [] and self.__events[0][0] <= target:
+            at, _, callback, args = heapq.heappop(self.__events)
+            self.now = max(self.now, at)
+            callback(*args)
+        self.now = target
+        if self.end is not None and self.now >= self.end and self.on_end is not None:
+            self.on_end()
+
+
+class SimulatedStreamer(object):
+    # Synthetic behaviour of a channel: how often and how long it streams, drops and multipliers
+    __slots__ = [
+        "streamer",
+        "average_gap",
+        "average_duration",
+        "drops",
+        "broadcasts",
+        "broadcast_id",
+        "watched",
+        "watched_since_bonus",
+        "streak_possible",
+    ]
+
+    def __init__(self, streamer, average_gap, average_duration, drops):
+        self.streamer = streamer
+        self.average_gap = average_gap
+        self.average_duration = average_duration
+        self.drops = drops
+        self.broadcasts = 0
+        self.broadcast_id = None
+        # Seconds watched during the current broadcast
+        self.watched = 0.0
+        self.watched_since_bonus = 0.0
+        self.streak_possible = False
+
+
+class SimulatedAsyncClient(object):
+    # Same interface as AsyncClient, every request is answered by the simulation in the calling thread
+    __slots__ = ["simulation", "loop", "requests"]
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+        self.loop = asyncio.new_event_loop()
+        self.requests = 0
+
+    def in_loop(self) -> bool:
+        return False
+
+    def run(self, coro, timeout=None):
+        return self.loop.run_until_complete(coro)
+
+    def stop(self):
+        self.loop.close()
+
+    async def request(self, method, url, headers=None, data=None, timeout=None):
+        self.requests += 1
+        return self.simulation.http(method, url, data)
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    async def head(self, url, **kwargs):
+        return await self.request("HEAD", url, **kwargs)
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "connections": 0, "reused": 0}
+
+
+class SimulatedBatcher(object):
+    # Same interface as GQLBatcher, answered immediately
+    __slots__ = ["simulation", "batches", "operations"]
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+        self.batches = 0
+        self.operations = 0
+
+    async def submit(self, json_data, deadline=None):
+        # Answered right away, no deadline can be missed
+        self.batches += 1
+        self.operations += 1
+        return self.simulation.gql(json_data.operation_name, json_data.variables)
+
+    def stop(self):
+        pass
+
+
+class SimulatedResponse(object):
+    __slots__ = ["status_code", "text"]
+
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+
+
+class SimulatedHTTPPool(object):
+    # Same interface as HTTPPool for the few pages downloaded with it (client version, spade url)
+    __slots__ = []
+
+    def get(self, url, **kwargs):
+        if "/config/settings" in url:
+            return SimulatedResponse(200, '{"spade_url":"https://spade.simulation/"}')
+        return SimulatedResponse(
+            200,
+            '<script src="https://assets.twitch.tv/config/settings.simulation.js"></script>',
+        )
+
+    def timeout(self, url):
+        return 1
+
+
+class Simulation(object):
+    """
+    Run the real watch loop (Twitch.send_minute_watched_events) on a synthetic population of streamers,
+    with a virtual clock and all the HTTP answered locally. Deterministic for a given seed.
+    The clock replaces the time of the runtime modules only during run(), the cookies and the caches
+    are written in a temporary directory removed with the simulation.
+    """
+
+    __slots__ = [
+        "priority",
+        "hours",
+        "clock",
+        "random",
+        "twitch",
+        "channels",
+        "streamers",
+        "points",
+        "streaks",
+        "streaks_possible",
+        "drop_seconds",
+        "watched_seconds",
+        "data_path",
+    ]
+
+    def __init__(
+        self,
+        streamers: int = 100,
+        priority: list = None,
+        hours: float = 24,
+        seed: int = 0,
+        drops_ratio: float = 0.1,
+    ):
+        self.priority = (
+            [Priority.STREAK, Priority.DROPS, Priority.ORDER]
+            if priority is None
+            else priority
+        )
+        self.hours = hours
+        self.clock = VirtualClock()
+        self.random = random.Random(seed)
+        self.points = 0
+        self.streaks = 0
+        self.streaks_possible = 0
+        self.drop_seconds = 0.0
+        self.watched_seconds = 0.0
+
+        self.data_path = tempfile.TemporaryDirectory(prefix="simulation-")
+        self.twitch = Twitch(
+            "simulation",
+            "simulation",
+            http_pool=SimulatedHTTPPool(),
+            data_path=self.data_path.name,
+        )
+        self.twitch.twitch_login.cookies = [
+            {"name": "auth-token", "value": "simulation"},
+            {"name": "persistent", "value": "1%3Asimulation"},
+        ]
+        self.twitch.async_client = SimulatedAsyncClient(self)
+        self.twitch.gql_batcher = SimulatedBatcher(self)
+        # Nothing to throttle and nothing to cache, the virtual time runs much faster than the real one
+        self.twitch.gql_scheduler = GQLScheduler(rate=10**9, burst=10**9)
+        self.twitch.gql_cache = GQLCache(ttl={})
+
+        self.channels = {}
+        self.streamers = StreamerRegistry()
+        for index in range(0, streamers):
+            settings = StreamerSettings(
+                make_predictions=False,
+                follow_raid=False,
+                claim_drops=True,
+                claim_moments=False,
+                watch_streak=True,
+                community_goals=False,
+                chat=ChatPresence.NEVER,
+            )
+            settings.default()
+            streamer = Streamer(f"streamer{index}", settings=settings)
+            streamer.channel_id = str(index + 1)
+            streamer.channel_points = self.random.randint(0, 100_000)
+            if self.random.random() < 0.1:
+                streamer.activeMultipliers = [{"factor": 0.2}]
+            channel = SimulatedStreamer(
+                streamer,
+                # Between one stream every few hours and one every few days
+                average_gap=self.random.uniform(4, 72) * 60 * 60,
+                average_duration=self.random.uniform(1, 6) * 60 * 60,
+                drops=self.random.random() < drops_ratio,
+            )
+            self.channels[streamer.username] = channel
+            self.streamers.add(streamer)
+            self.clock.schedule(
+                self.clock.now + self.random.expovariate(1 / channel.average_gap),
+                self.stream_up,
+                channel,
+            )
+
+    # === EVENTS === #
+
+    def stream_up(self, channel):
+        channel.broadcasts += 1
+        channel.broadcast_id = f"{channel.streamer.channel_id}-{channel.broadcasts}"
+        channel.watched = 0.0
+        channel.watched_since_bonus = 0.0
+        streamer = channel.streamer
+        channel.streak_possible = (
+            streamer.offline_at == 0
+            or ((self.clock.now - streamer.offline_at) // 60) > 30
+        )
+        if channel.streak_possible is True:
+            self.streaks_possible += 1
+        # What the WebSocket does with a stream-up message, the watch loop confirms it after the grace period
+        self.twitch.stream_monitor.stream_up(streamer)
+        self.clock.schedule(
+            self.clock.now + self.random.expovariate(1 / channel.average_duration),
+            self.stream_down,
+            channel,
+        )
+
+    def stream_down(self, channel):
+        channel.broadcast_id = None
+        # What the WebSocket does with a stream-down message
+        self.twitch.stream_monitor.stream_down(channel.streamer)
+        self.clock.schedule(
+            self.clock.now + self.random.expovariate(1 / channel.average_gap),
+            self.stream_up,
+            channel,
+        )
+
+    def minute_watched(self, channel, seconds):
+        streamer = channel.streamer
+        if channel.broadcast_id is None:
+            return
+        self.watched_seconds += seconds
+        channel.watched += seconds
+        channel.watched_since_bonus += seconds
+        earned = (
+            seconds / 60 * POINTS_PER_MINUTE * (1 + streamer.total_points_multiplier())
+        )
+        if channel.watched_since_bonus >= BONUS_INTERVAL:
+            channel.watched_since_bonus -= BONUS_INTERVAL
+            earned += BONUS_POINTS
+        if (
+            channel.streak_possible is True
+            and streamer.stream.watch_streak_missing is True
+            and channel.watched >= WATCH_STREAK_MINUTES * 60
+        ):
+            earned += WATCH_STREAK_POINTS
+            streamer.update_history("WATCH_STREAK", WATCH_STREAK_POINTS)
+            self.streaks += 1
+        if streamer.drops_condition() is True:
+            self.drop_seconds += seconds
+        self.points += earned
+        streamer.channel_points += int(earned)
+        # What the WebSocket does with a points-earned message
+        self.twitch.watch_selector.update(streamer)
+
+    # === HTTP === #
+
+    def http(self, method, url, data=None):
+        parsed = urlparse(url)
+        if parsed.netloc == "usher.ttvnw.net":
+            login = parsed.path.split("/")[-1].replace(".m3u8", "")
+            return 200, (
+                "#EXTM3U\n"
+                '#EXT-X-STREAM-INF:BANDWIDTH=8000000,RESOLUTION=1920x1080,VIDEO="chunked"\n'
+                f"https://video.simulation/{login}/chunked.m3u8\n"
+                '#EXT-X-STREAM-INF:BANDWIDTH=300000,RESOLUTION=284x160,VIDEO="160p30"\n'
+                f"https://video.simulation/{login}/160p30.m3u8\n"
+            )
+        if parsed.netloc == "video.simulation":
+            if method == "HEAD":
+                return 200, ""
+            sequence = int(self.clock.now // 2)
+            return 200, (
+                "#EXTM3U\n"
+                f"#EXT-X-MEDIA-SEQUENCE:{sequence}\n"
+                "#EXTINF:2.000,live\n"
+                f"{sequence}.ts\n"
+            )
+        if parsed.netloc == "spade.simulation":
+            events = json.loads(b64decode(data["data"]))
+            for event in events:
+                channel = self.channels.get(event["properties"]["channel"])
+                if channel is not None:
+                    self.minute_watched(channel, self.twitch.watch_jitter.interval)
+            return 204, ""
+        if url == GQLOperations.url:
+            body = json.loads(data)
+            if isinstance(body, list):
+                return 200, json.dumps(
+                    [
+                        self.gql(item["operationName"], item["variables"])
+                        for item in body
+                    ]
+                )
+            return 200, json.dumps(self.gql(body["operationName"], body["variables"]))
+        return 404, ""
+
+    def gql(self, operation_name, variables):
+        if operation_name == "PlaybackAccessToken":
+            return {
+                "data": {
+                    "streamPlaybackAccessToken": {
+                        "signature": "simulation",
+                        "value": json.dumps({"expires": self.clock.now + 24 * 60 * 60}),
+                    }
+                }
+            }
+        if operation_name == "VideoPlayerStreamInfoOverlayChannel":
+            channel = self.channels.get(variables["channel"])
+            if channel is None or channel.broadcast_id is None:
+                return {"data": {"user": {"stream": None}}}
+            return {
+                "data": {
+                    "user": {
+                        "stream": {
+                            "id": channel.broadcast_id,
+                            "tags": [],
+                            "viewersCount": 100,
+                        },
+                        "broadcastSettings": {
+                            "title": f"Simulated stream {channel.broadcast_id}",
+                            "game": {
+                                "id": "1",
+                                "name": "simulation",
+                                "displayName": "Simulation",
+                            },
+                        },
+                    }
+                }
+            }
+        if operation_name == "DropsHighlightService_AvailableDrops":
+            channel = self.__channel_by_id(variables["channelID"])
+            campaigns = (
+                [{"id": f"campaign-{variables['channelID']}"}]
+                if channel is not None and channel.drops is True
+                else None
+            )
+            return {"data": {"channel": {"viewerDropCampaigns": campaigns}}}
+        return {}
+
+    def __channel_by_id(self, channel_id):
+        streamer = self.streamers.by_channel_id(channel_id)
+        return None if streamer is None else self.channels[streamer.username]
+
+    # === RUN === #
+
+    def run(self) -> dict:
+        started = time.perf_counter()
+        start = self.clock.now
+        self.clock.end = start + self.hours * 60 * 60
+        self.clock.on_end = self.__stop
+        try:
+            with virtual_time(self.clock):
+                self.twitch.send_minute_watched_events(self.streamers, self.priority)
+        finally:
+            self.twitch.spade_url.stop()
+            self.twitch.client_version.stop()
+            self.twitch.async_client.stop()
+            self.data_path.cleanup()
+        return self.report(time.perf_counter() - started)
+
+    def __stop(self):
+        self.twitch.running = False
+
+    def report(self, elapsed: float) -> dict:
+        return {
+            "streamers": len(self.streamers),
+            "priority": [str(prior.name) for prior in self.priority],
+            "hours": self.hours,
+            "points_per_hour": round(self.points / self.hours, 1),
+            "watched_hours": round(self.watched_seconds / 3600, 1),
+            "streaks": self.streaks,
+            "streaks_possible": self.streaks_possible,
+            "drop_minutes": round(self.drop_seconds / 60, 1),
+            "stream_info_checks": self.twitch.stream_monitor.checks,
+            "transitions": self.twitch.stream_monitor.stats(),
+            "elapsed": round(elapsed, 2),
+        }
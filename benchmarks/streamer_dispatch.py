@@ -0,0 +1,103 @@
+# Dispatch of the PubSub messages to their streamer: the old linear scan of the list against the StreamerRegistry.
+# Usage (from the root of the repository): python -m benchmarks.streamer_dispatch [streamers] [messages]
+
+import json
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+from TwitchChannelPointsMiner.classes.entities.Streamer import Streamer
+from TwitchChannelPointsMiner.classes.Settings import Settings
+from TwitchChannelPointsMiner.classes.StreamerRegistry import StreamerRegistry
+from TwitchChannelPointsMiner.classes.StreamMonitor import StreamMonitor
+from TwitchChannelPointsMiner.classes.WebSocketsPool import WebSocketsPool
+from TwitchChannelPointsMiner.logger import LoggerSettings
+
+
+# What the message handler did before the registry (utils.get_streamer_index)
+def linear_scan(streamers, channel_id):
+    try:
+        return next(
+            i for i, x in enumerate(streamers) if str(x.channel_id) == str(channel_id)
+        )
+    except StopIteration:
+        return -1
+
+
+def new_streamers(count):
+    streamers = []
+    for index in range(0, count):
+        streamer = Streamer(f"streamer{index}")
+        streamer.channel_id = str(100000 + index)
+        streamers.append(streamer)
+    return streamers
+
+
+def new_messages(streamers, count):
+    # stream-up is the cheapest message to handle, the time spent is mostly the lookup
+    channel_ids = [random.choice(streamers).channel_id for _ in range(0, count)]
+    return [
+        json.dumps(
+            {
+                "type": "MESSAGE",
+                "data": {
+                    "topic": f"video-playback-by-id.{channel_id}",
+                    "message": json.dumps(
+                        {"type": "stream-up", "server_time": 1700000000 + i}
+                    ),
+                },
+            }
+        )
+        for i, channel_id in enumerate(channel_ids)
+    ]
+
+
+def measure(function, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    messages_count = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    random.seed(0)
+    # Streamer.__str__ reads the logger settings
+    Settings.logger = LoggerSettings()
+
+    streamers = new_streamers(count)
+    registry = StreamerRegistry(streamers)
+    channel_ids = [random.choice(streamers).channel_id for _ in range(0, messages_count)]
+    messages = new_messages(streamers, messages_count)
+
+    scan_time = measure(
+        lambda: [linear_scan(streamers, channel_id) for channel_id in channel_ids]
+    )
+    registry_time = measure(
+        lambda: [registry.by_channel_id(channel_id) for channel_id in channel_ids]
+    )
+
+    # The whole handler path: JSON decoding, Message, lookup and handler (what a worker of the pool runs)
+    ws = SimpleNamespace(
+        index=0,
+        streamers=registry,
+        twitch=SimpleNamespace(stream_monitor=StreamMonitor(twitch=None)),
+    )
+    dispatch_time = measure(
+        lambda: [
+            WebSocketsPool.on_response(ws, json.loads(message)) for message in messages
+        ]
+    )
+
+    print(f"{count} streamers, {messages_count} messages (best of 5)")
+    print(f"linear scan lookup: {scan_time * 1000:.1f}ms")
+    print(f"registry lookup: {registry_time * 1000:.1f}ms")
+    print(f"speed-up: x{scan_time / registry_time:.1f}")
+    print(
+        f"on_response with the registry: {dispatch_time * 1000:.1f}ms ({dispatch_time / messages_count * 10**6:.1f}µs per message)"
+    )
@@ -0,0 +1,44 @@
+# Run the watch loop on a synthetic population of streamers with a virtual clock, no request leaves the machine.
+# Usage (from the root of the repository):
+#   python -m benchmarks.watch_simulation [--streamers 300] [--hours 100] [--seed 0] [--priority STREAK DROPS ORDER]
+
+import argparse
+import logging
+
+from benchmarks.simulation import Simulation
+from TwitchChannelPointsMiner.classes.Settings import Priority, Settings
+from TwitchChannelPointsMiner.logger import LoggerSettings
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--streamers", type=int, default=300)
+    parser.add_argument("--hours", type=float, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--priority",
+        nargs="+",
+        default=["STREAK", "DROPS", "ORDER"],
+        choices=[prior.name for prior in Priority],
+    )
+    args = parser.parse_args()
+
+    # The miner logs every online/offline event, way too much for thousands of hours
+    logging.basicConfig(level=logging.WARNING)
+    Settings.logger = LoggerSettings()
+
+    report = Simulation(
+        streamers=args.streamers,
+        priority=[Priority[name] for name in args.priority],
+        hours=args.hours,
+        seed=args.seed,
+    ).run()
+    print(
+        f"{report['streamers']} streamers, {report['hours']} hours, priority {', '.join(report['priority'])}"
+    )
+    print(f"points per hour: {report['points_per_hour']}")
+    print(f"hours watched: {report['watched_hours']}")
+    print(f"watch streaks: {report['streaks']}/{report['streaks_possible']}")
+    print(f"drop minutes: {report['drop_minutes']}")
+    print(f"stream info requests: {report['stream_info_checks']}")
+    print(f"transitions: {report['transitions']}")
+    print(f"simulated in {report['elapsed']}s")
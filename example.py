@@ -27,6 +27,8 @@ twitch_miner = TwitchChannelPointsMiner(
     enable_analytics=False,                     # Disables Analytics if False. Disabling it significantly reduces memory consumption
     disable_ssl_cert_verification=False,        # Set to True at your own risk and only to fix SSL: CERTIFICATE_VERIFY_FAILED error
     disable_at_in_nickname=False,               # Set to True if you want to check for your nickname mentions in the chat even without @ sign
+    progressive_startup=False,                  # Set to True to start watching the first streamers while the others are still loading (useful with many followers)
+    max_pubsub_connections=10,                  # PubSub connections (50 topics each). With too many streamers, the topics of the offline ones are left out first
     logger_settings=LoggerSettings(
         save=True,                              # If you want to save logs in a file (suggested)
         console_level=logging.INFO,             # Level of logs - use logging.DEBUG for more info
@@ -27,7 +27,7 @@ setuptools.setup(
     include_package_data=True,
     install_requires=[
         "requests",
-        "websocket-client",
+        "aiohttp",
         "pillow",
         "python-dateutil",
         "emoji",